@@ -1,21 +1,87 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, has_request_context, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from flask_socketio import SocketIO, emit
+from flask_sqlalchemy.session import Session
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from werkzeug.middleware.proxy_fix import ProxyFix
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
+import base64
+import collections
+import gzip
+import csv
+import hashlib
+import io
 import math
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy אופציונלי - חישובי מרחק נופלים ללולאת Python
+    np = None
+
+try:
+    import orjson
+except ImportError:  # orjson אופציונלי - JSON נופל למודול json הרגיל
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli אופציונלי - הדחיסה נופלת ל-gzip בלבד
+    brotli = None
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 
+class JSONProvider(DefaultJSONProvider):
+    """JSON של התשובות - orjson כשמותקן; תאריכים ב-ISO 8601 (כמו to_dict) גם בלעדיו"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return options | orjson.OPT_SORT_KEYS if self.sort_keys else options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # במצב debug התשובה מעוצבת (indent) - נשאר במימוש הרגיל
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        body = orjson.dumps(self._prepare_response_obj(args, kwargs), default=self.default,
+                            option=self._orjson_options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+app.json = JSONProvider(app)
+
 # Flask Configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['ENV'] = os.getenv('FLASK_ENV', 'development')
@@ -25,17 +91,171 @@ cors_origins = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
 CORS(app,
      resources={r"/api/*": {"origins": cors_origins}},
      supports_credentials=True,
-     allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'],
+     allow_headers=['Content-Type', 'Authorization', 'X-Requested-With', 'If-None-Match'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-     expose_headers=['Content-Type', 'Authorization'])
+     expose_headers=['Content-Type', 'Authorization', 'X-Next-Cursor', 'ETag'])
 
 # Database configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
 default_db_uri = 'sqlite:///' + os.path.join(basedir, 'fire_department.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', default_db_uri)
+
+def database_url(uri):
+    # כתובות בסגנון postgres:// (Heroku וכו') אינן נתמכות ב-SQLAlchemy 2
+    if uri and uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url(os.getenv('DATABASE_URL', default_db_uri))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# Read replica - בקשות GET קוראות מהעותק (ריק = הכל מהמסד הראשי)
+app.config['DATABASE_REPLICA_URL'] = database_url(os.getenv('DATABASE_REPLICA_URL')) or None
+# משתמש שכתב קורא מהמסד הראשי בשניות הבאות (read-your-writes), עד שהעותק מתעדכן
+app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+# Connection pool - לכל תהליך (worker) מאגר משלו
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))  # שניות המתנה לחיבור פנוי
+app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))  # חידוש חיבורים לפני ניתוק בצד השרת
+app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'True').lower() in ('true', '1', 'yes')
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))  # PostgreSQL; 0 = ללא
+# SQLite - WAL מאפשר קריאות במקביל לכתיבה; busy_timeout ממתין לנעילה במקום להיכשל מיד
+app.config['SQLITE_WAL'] = os.getenv('SQLITE_WAL', 'True').lower() in ('true', '1', 'yes')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+def engine_options(uri):
+    """אפשרויות המנוע לפי סוג מסד הנתונים"""
+    url = make_url(uri)
+    options = {
+        'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+    }
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+        if url.database in (None, '', ':memory:'):
+            return options  # מסד בזיכרון - חיבור יחיד, אין מאגר לכוונן
+    elif url.get_backend_name() == 'postgresql' and app.config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'options': f"-c statement_timeout={app.config['DB_STATEMENT_TIMEOUT_MS']}"}
+    options.update(
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+    )
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+if app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': {
+        'url': app.config['DATABASE_REPLICA_URL'],
+        **engine_options(app.config['DATABASE_REPLICA_URL']),
+    }}
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    # ניהול הטרנזקציות עובר ל-_begin_transaction (ה-driver לא פותח BEGIN בעצמו)
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    if app.config['SQLITE_WAL']:
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute('PRAGMA synchronous = NORMAL')  # בטוח ב-WAL, חוסך fsync בכל commit
+    cursor.close()
+
+def _begin_transaction(connection):
+    """ב-SQLite טרנזקציה של בקשת כתיבה תופסת את נעילת הקובץ כבר בהתחלה (BEGIN IMMEDIATE)
+
+    SQLite מאפשר כותב אחד בכל רגע; טרנזקציה שקראה ורק אחר כך מנסה לכתוב נכשלת מיד (busy)
+    אם כותב אחר עשה commit בינתיים, במקום להמתין. קריאות (GET) אינן ממתינות בזכות WAL.
+    ב-PostgreSQL כותבים רצים במקביל - נועלים רק את השורות שנכתבות (get_for_update_or_404).
+    """
+    if connection.dialect.name == 'sqlite':
+        writing = has_request_context() and request.method in WRITE_METHODS
+        connection.exec_driver_sql('BEGIN IMMEDIATE' if writing else 'BEGIN')
+
+# Dashboard counters - מונים מתוחזקים במקום ספירה מלאה בכל טעינת דשבורד
+app.config['DASHBOARD_COUNTERS'] = os.getenv('DASHBOARD_COUNTERS', 'True').lower() in ('true', '1', 'yes')
+app.config['COUNTERS_RECONCILE_SECONDS'] = int(os.getenv('COUNTERS_RECONCILE_SECONDS', 3600))
+
+# Proximity - מרחק מקסימלי (במטרים) לקישור בין הידרנט לארון
+app.config['PROXIMITY_DISTANCE_METERS'] = int(os.getenv('PROXIMITY_DISTANCE_METERS', 100))
+
+# Alerts cache - תוקף מקסימלי (גם כשאין חציית סף צפויה), מכסה כתיבות מתהליכים אחרים
+app.config['ALERTS_CACHE_SECONDS'] = int(os.getenv('ALERTS_CACHE_SECONDS', 300))
+
+# Response compression - gzip/brotli לפי Accept-Encoding, רק מעל סף גודל (מתחתיו הדחיסה לא משתלמת)
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes
+app.config['COMPRESS_GZIP_LEVEL'] = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))  # 1-9
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))  # 0-11
+# Response cache - גופי תשובות (דחוסים) של אוספים לפי ETag, כדי לא לבנות ולדחוס שוב בבקשה חוזרת; 0 = כבוי
+app.config['RESPONSE_CACHE_MB'] = int(os.getenv('RESPONSE_CACHE_MB', 32))
+
+# User cache - המשתמש המחובר נטען מהזיכרון במקום שאילתה בכל בקשה; התוקף מכסה שינויים מתהליכים אחרים
+app.config['USER_CACHE_SECONDS'] = int(os.getenv('USER_CACHE_SECONDS', 30))
+
+# Password hashing - חישובי סיסמה (PBKDF2) רצים במאגר threads מוגבל, כדי שגל התחברויות לא יחסום את שאר הבקשות
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 16))  # ממתינים מעבר לזה מקבלים 503
+
+# Login throttling - חסימת ניסיונות כושלים לפי שם משתמש ולפי כתובת IP בחלון זמן
+app.config['LOGIN_MAX_FAILURES'] = int(os.getenv('LOGIN_MAX_FAILURES', 5))
+app.config['LOGIN_MAX_FAILURES_PER_IP'] = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 20))
+app.config['LOGIN_FAILURE_WINDOW_SECONDS'] = int(os.getenv('LOGIN_FAILURE_WINDOW_SECONDS', 300))
+
+# Reverse proxy - מספר הפרוקסים שמוסיפים X-Forwarded-For, כדי שכתובת הלקוח (ולא של הפרוקסי) תשמש לחסימה לפי IP
+# 0 = אין פרוקסי; אסור להגדיר יותר מהמספר האמיתי, אחרת לקוח יכול לזייף את הכתובת שלו
+app.config['TRUSTED_PROXY_COUNT'] = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+if app.config['TRUSTED_PROXY_COUNT'] > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+
+# Socket.IO async mode - threading לשרת הפיתוח; gunicorn.conf.py קובע gevent/eventlet בייצור
+app.config['SOCKETIO_ASYNC_MODE'] = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+
+# Socket.IO scaling - תור הודעות משותף כשרצים כמה תהליכים (ריק = בזיכרון, תהליך יחיד)
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None  # redis://..., amqp://...
+app.config['SOCKETIO_CHANNEL'] = os.getenv('SOCKETIO_CHANNEL', 'fire-department')
+# websocket בלבד - כל חיבור נשאר על אותו תהליך, ללא צורך ב-sticky sessions במאזן העומסים
+app.config['SOCKETIO_TRANSPORTS'] = os.getenv('SOCKETIO_TRANSPORTS', 'polling,websocket').split(',')
+# שם עוגייה למאזן עומסים שמבצע sticky sessions לפי עוגייה (עבור long-polling)
+app.config['SOCKETIO_STICKY_COOKIE'] = os.getenv('SOCKETIO_STICKY_COOKIE') or None
+
+READ_METHODS = ('GET', 'HEAD')
+
+def reads_from_replica():
+    """בקשת קריאה של משתמש שלא כתב לאחרונה"""
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    return session.get('db_write_at', 0) + app.config['REPLICA_STICKY_SECONDS'] < time.time()
+
+class RoutingSession(Session):
+    """Session שמפנה שאילתות SELECT של בקשות קריאה לעותק הקריאה
+
+    כתיבה (flush, UPDATE/DELETE) הולכת תמיד למסד הראשי, ומאותו רגע גם שאר הטרנזקציה -
+    כדי שהבקשה תראה את מה שכתבה.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and 'replica' in self._db.engines:
+            if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+                self.info['primary'] = True
+            elif (not self.info.get('primary') and clause is not None
+                  and getattr(clause, 'is_select', False) and reads_from_replica()):
+                return self._db.engines['replica']
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+def use_primary():
+    """שאר הטרנזקציה קוראת מהמסד הראשי - לקריאות שתוצאתן נכתבת חזרה"""
+    db.session.info['primary'] = True
+
+with app.app_context():
+    for engine in db.engines.values():
+        event.listen(engine, 'connect', _configure_sqlite_connection)
+        event.listen(engine, 'begin', _begin_transaction)
 
 # Flask-Login Configuration
 login_manager = LoginManager()
@@ -51,6 +271,9 @@ class Team(db.Model):
     status = db.Column(db.String(20), default='available')  # available, on_duty, unavailable
     phone = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_team_status', 'status'),
+    )
     
     def to_dict(self):
         return {
@@ -80,6 +303,11 @@ class Hydrant(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_hydrant_status', 'status'),
+        db.Index('ix_hydrant_last_inspection_date', 'last_inspection_date'),
+        db.Index('ix_hydrant_latitude_longitude', 'latitude', 'longitude'),
+    )
     
     def to_dict(self):
         return {
@@ -118,6 +346,10 @@ class EquipmentCabinet(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_equipment_cabinet_status', 'status'),
+        db.Index('ix_equipment_cabinet_latitude_longitude', 'latitude', 'longitude'),
+    )
     
     def to_dict(self):
         return {
@@ -162,6 +394,11 @@ class Task(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_task_status_due_date', 'status', 'due_date'),
+        db.Index('ix_task_quarter_year', 'quarter', 'year'),
+        db.Index('ix_task_priority', 'priority'),
+    )
     
     def to_dict(self):
         return {
@@ -199,6 +436,10 @@ class MaintenanceRecord(db.Model):
     cost = db.Column(db.Float)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_maintenance_record_item_type_item_id_date', 'item_type', 'item_id', 'date'),
+        db.Index('ix_maintenance_record_date', 'date'),
+    )
     
     def to_dict(self):
         return {
@@ -227,6 +468,9 @@ class Volunteer(db.Model):
     last_activity = db.Column(db.DateTime)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_volunteer_status', 'status'),
+    )
     
     def to_dict(self):
         return {
@@ -257,6 +501,11 @@ class EquipmentItem(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_equipment_item_item_type_expiry_date', 'item_type', 'expiry_date'),
+        db.Index('ix_equipment_item_cabinet_id', 'cabinet_id'),
+        db.Index('ix_equipment_item_status', 'status'),
+    )
     
     def to_dict(self):
         return {
@@ -329,6 +578,10 @@ class Activity(db.Model):
     status = db.Column(db.String(20), default='planned')  # planned, ongoing, completed, cancelled
     created_by = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_activity_date', 'date'),
+        db.Index('ix_activity_status', 'status'),
+    )
     
     def to_dict(self):
         return {
@@ -347,10 +600,575 @@ class Activity(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class DashboardCounter(db.Model):
+    """מונים מצטברים לדשבורד - מתעדכנים בכל כתיבה ומתואמים מחדש מעת לעת"""
+    name = db.Column(db.String(100), primary_key=True)  # e.g. tasks.total, tasks.status.new
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class ProximityLink(db.Model):
+    """קישור קרבה בין הידרנט לארון ציוד - מקור האמת לשדות nearby_cabinets / nearby_hydrants"""
+    hydrant_id = db.Column(db.Integer, db.ForeignKey('hydrant.id', ondelete='CASCADE'), primary_key=True)
+    cabinet_id = db.Column(db.Integer, db.ForeignKey('equipment_cabinet.id', ondelete='CASCADE'), primary_key=True)
+    distance = db.Column(db.Float, nullable=False)  # מטרים
+    __table_args__ = (
+        db.Index('ix_proximity_link_cabinet_id', 'cabinet_id'),
+    )
+
+class TeamMember(db.Model):
+    """חבר צוות - מנורמל מהשדה Team.members (שנשאר בתשובות ה-API לתאימות)"""
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    __table_args__ = (
+        db.Index('ix_team_member_team_id', 'team_id'),
+        db.Index('ix_team_member_name', 'name'),
+    )
+
+class VolunteerSkill(db.Model):
+    """כישור של מתנדב - מנורמל מהשדה Volunteer.skills"""
+    id = db.Column(db.Integer, primary_key=True)
+    volunteer_id = db.Column(db.Integer, db.ForeignKey('volunteer.id', ondelete='CASCADE'), nullable=False)
+    skill = db.Column(db.String(200), nullable=False)
+    __table_args__ = (
+        db.Index('ix_volunteer_skill_volunteer_id', 'volunteer_id'),
+        db.Index('ix_volunteer_skill_skill', 'skill'),
+    )
+
+class ActivityParticipant(db.Model):
+    """משתתף בפעילות (לפי שם) - מנורמל מהשדה Activity.participants"""
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    __table_args__ = (
+        db.Index('ix_activity_participant_activity_id', 'activity_id'),
+        db.Index('ix_activity_participant_name', 'name'),
+    )
+
+class Attachment(db.Model):
+    """קובץ/תמונה מצורפים - מנורמל מהשדות Hydrant.images ו-Task.attachments"""
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # hydrant, task
+    entity_id = db.Column(db.Integer, nullable=False)
+    url = db.Column(db.Text, nullable=False)
+    __table_args__ = (
+        db.Index('ix_attachment_entity_entity_id', 'entity', 'entity_id'),
+    )
+
+class CabinetEquipment(db.Model):
+    """פריט ברשימת הציוד של ארון - מנורמל מהשדה EquipmentCabinet.equipment_list"""
+    id = db.Column(db.Integer, primary_key=True)
+    cabinet_id = db.Column(db.Integer, db.ForeignKey('equipment_cabinet.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Integer)
+    __table_args__ = (
+        db.Index('ix_cabinet_equipment_cabinet_id', 'cabinet_id'),
+        db.Index('ix_cabinet_equipment_name', 'name'),
+    )
+
+class SchemaMigration(db.Model):
+    """גרסאות סכמה שהוחלו על מסד הנתונים"""
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CollectionVersion(db.Model):
+    """מונה כתיבות לכל טבלה - מתקדם בתוך הטרנזקציה של הכתיבה (משמש ל-ETag ולמטמונים)"""
+    name = db.Column(db.String(100), primary_key=True)  # table name
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SyncChange(db.Model):
+    """יומן שינויים לסנכרון מצטבר - שורה אחת לכל רשומה (השינוי האחרון), כולל מצבות למחיקות"""
+    seq = db.Column(db.Integer, primary_key=True)  # sync token
+    entity = db.Column(db.String(50), nullable=False)  # key in SYNC_MODELS
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_sync_change_entity_entity_id', 'entity', 'entity_id', unique=True),
+        {'sqlite_autoincrement': True},  # seq לא ממוחזר גם כשהשורה האחרונה נמחקת
+    )
+
+# ישויות שנכללות בסנכרון המצטבר של לקוחות השטח
+SYNC_MODELS = {
+    'hydrants': Hydrant,
+    'equipment_cabinets': EquipmentCabinet,
+    'tasks': Task,
+    'equipment_items': EquipmentItem,
+}
+SYNC_ENTITIES = {model: entity for entity, model in SYNC_MODELS.items()}
+
+# ישויות שמפורסמות כאירועי שינוי ב-Socket.IO: שם החדר של סוג הישות
+PUSH_ROOMS = {
+    Team: 'teams',
+    Hydrant: 'hydrants',
+    EquipmentCabinet: 'equipment_cabinets',
+    EquipmentItem: 'equipment_items',
+    Task: 'tasks',
+    Volunteer: 'volunteers',
+    Activity: 'activities',
+    MaintenanceRecord: 'maintenance',
+}
+PUSH_MAX_IDS = 100  # מעבר לזה אירוע כתיבה מרוכזת נשלח כ-reload בלי רשימת מזהים
+
+# שדות רשימה (JSON או טקסט חופשי בעמודת Text) והטבלה המנורמלת שמשקפת כל אחד
+LIST_FIELDS = {
+    Team: {'field': 'members', 'table': TeamMember, 'owner': 'team_id', 'value': 'name'},
+    Volunteer: {'field': 'skills', 'table': VolunteerSkill, 'owner': 'volunteer_id', 'value': 'skill'},
+    Activity: {'field': 'participants', 'table': ActivityParticipant, 'owner': 'activity_id', 'value': 'name'},
+    Hydrant: {'field': 'images', 'table': Attachment, 'owner': 'entity_id', 'value': 'url', 'fixed': {'entity': 'hydrant'}},
+    Task: {'field': 'attachments', 'table': Attachment, 'owner': 'entity_id', 'value': 'url', 'fixed': {'entity': 'task'}},
+    EquipmentCabinet: {'field': 'equipment_list', 'table': CabinetEquipment, 'owner': 'cabinet_id', 'value': 'name'},
+}
+LIST_ENTRY_KEYS = ('name', 'url', 'skill', 'item_name', 'item_type', 'title')  # שם הערך כשפריט ברשימה הוא אובייקט
+
+def parse_list_field(value):
+    """פריטי שדה רשימה: מערך JSON, או טקסט חופשי מופרד בפסיקים/שורות (כפי שהממשק שולח)"""
+    text = (value or '').strip()
+    if not text:
+        return []
+    try:
+        entries = json.loads(text)
+    except ValueError:
+        entries = re.split(r'[,;\n]', text)
+    if not isinstance(entries, list):
+        entries = [entries]
+    return [entry for entry in entries if entry not in (None, '')]
+
+def list_field_rows(model, owner_id, value):
+    """שורות הטבלה המנורמלת לערך שדה הרשימה של פריט אחד"""
+    spec = LIST_FIELDS[model]
+    max_length = spec['table'].__table__.columns[spec['value']].type.length
+    rows = []
+    seen = set()
+    for entry in parse_list_field(value):
+        quantity = None
+        if isinstance(entry, dict):
+            quantity = entry.get('quantity')
+            entry = next((entry[key] for key in LIST_ENTRY_KEYS if entry.get(key)), None)
+        name = str(entry).strip()[:max_length] if entry is not None else ''
+        if not name or (name in seen and spec['table'] is not CabinetEquipment):
+            continue
+        seen.add(name)
+        row = {spec['owner']: owner_id, spec['value']: name, **spec.get('fixed', {})}
+        if spec['table'] is CabinetEquipment:
+            row['quantity'] = int(quantity) if str(quantity).isdigit() else None
+        rows.append(row)
+    return rows
+
+def sync_list_rows(connection, model, items):
+    """החלפת השורות המנורמלות של פריטים: items = [(id, ערך שדה הרשימה, או None לפריט שנמחק)]"""
+    spec = LIST_FIELDS[model]
+    table = spec['table'].__table__
+    for chunk in _chunks([item_id for item_id, _ in items]):
+        stmt = table.delete().where(table.c[spec['owner']].in_(chunk))
+        for column, value in spec.get('fixed', {}).items():
+            stmt = stmt.where(table.c[column] == value)
+        connection.execute(stmt)
+    rows = [row for item_id, value in items for row in list_field_rows(model, item_id, value)]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+def list_owner_ids(model, value):
+    """שאילתת-משנה של מזהי הפריטים שברשימה שלהם מופיע הערך (בחיפוש באינדקס)"""
+    spec = LIST_FIELDS[model]
+    table = spec['table'].__table__
+    stmt = db.select(table.c[spec['owner']]).where(table.c[spec['value']] == value.strip())
+    for column, fixed in spec.get('fixed', {}).items():
+        stmt = stmt.where(table.c[column] == fixed)
+    return stmt
+
+# Full-text search - שדות הטקסט של כל ישות שנכנסים לאינדקס החיפוש (title מקבל משקל גבוה יותר)
+SEARCH_SPECS = {
+    'hydrants': {'model': Hydrant, 'title': ('name',), 'body': ('location', 'serial_number', 'notes'), 'label': 'name'},
+    'equipment_cabinets': {'model': EquipmentCabinet, 'title': ('name',), 'body': ('location', 'cabinet_number'),
+                           'label': 'name'},
+    'tasks': {'model': Task, 'title': ('title',), 'body': ('description',), 'label': 'title'},
+    'maintenance': {'model': MaintenanceRecord, 'title': (), 'body': ('description',), 'label': 'item_name'},
+}
+SEARCH_ENTITIES = {spec['model']: entity for entity, spec in SEARCH_SPECS.items()}
+SEARCH_CODES = {entity: code for code, entity in enumerate(SEARCH_SPECS)}  # rowid ב-FTS5: id * 8 + קוד הישות - להוסיף בסוף בלבד
+SEARCH_MAX_RESULTS = 100
+
+# טבלת האינדקס - FTS5 ב-SQLite, tsvector עם אינדקס GIN ב-PostgreSQL (נוצרת יחד עם create_all)
+SEARCH_INDEX_DDL = {
+    'sqlite': (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "entity UNINDEXED, entity_id UNINDEXED, label UNINDEXED, title, body)",
+    ),
+    'postgresql': (
+        "CREATE TABLE IF NOT EXISTS search_index ("
+        "entity VARCHAR(30) NOT NULL, entity_id INTEGER NOT NULL, label TEXT, document TSVECTOR NOT NULL, "
+        "PRIMARY KEY (entity, entity_id))",
+        "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)",
+    ),
+}
+
+HEBREW_MARKS = re.compile('[\u0591-\u05c7]')  # ניקוד וטעמים
+HEBREW_FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+HEBREW_PREFIXES = 'ובהלמשכ'  # אותיות שימוש שנצמדות לתחילת מילה
+HEBREW_LEADING_PREFIXES = 'ושמכ'  # אותיות שימוש שיכולה לבוא אחריהן אות שימוש נוספת ('וב', 'שה', 'כש')
+SEARCH_TOKEN = re.compile(r'\w+')
+
+def search_tokens(text):
+    """מילים מנורמלות לחיפוש: בלי ניקוד, אותיות סופיות כרגילות (כך שחיפוש תחילית עובד), אותיות קטנות"""
+    text = HEBREW_MARKS.sub('', text).translate(HEBREW_FINAL_LETTERS).lower()
+    return SEARCH_TOKEN.findall(text)
+
+def search_variants(token):
+    """המילה, ועוד הגרסאות שלה בלי אותיות שימוש בתחילתה ('ובשער' -> 'בשער', 'שער'): עד שתי אותיות,
+    רק כשנשארות לפחות 3 אותיות ('ברז' לא הופך ל'רז'), ואחרי ה/ב/ל לא מורידים עוד אות ('הברזים' לא הופך ל'רזים')"""
+    variants = [token]
+    for _ in range(2):
+        if len(token) <= 3 or token[0] not in HEBREW_PREFIXES:
+            break
+        prefix, token = token[0], token[1:]
+        variants.append(token)
+        if prefix not in HEBREW_LEADING_PREFIXES:
+            break
+    return variants
+
+def search_text(values):
+    """טקסט לאינדקס - כל מילה עם הגרסאות שלה בלי אותיות שימוש ('ובברז' נמצא גם כ'ברז')"""
+    words = []
+    for token in search_tokens(' '.join(str(value) for value in values if value)):
+        words.extend(search_variants(token))
+    return ' '.join(words)
+
+def update_search_index(connection, model, items):
+    """עדכון האינדקס לפריטים: items = [(id, אובייקט או dict עם שדות הטקסט, או None לפריט שנמחק)]"""
+    dialect = connection.dialect.name
+    if dialect not in SEARCH_INDEX_DDL or not items:
+        return
+    entity = SEARCH_ENTITIES[model]
+    spec = SEARCH_SPECS[entity]
+    code = SEARCH_CODES[entity]
+    rows = []
+    for item_id, item in items:
+        if item is None:
+            continue
+        get = item.get if isinstance(item, dict) else lambda field: getattr(item, field)
+        rows.append({
+            'rowid': item_id * 8 + code, 'entity': entity, 'entity_id': item_id, 'label': get(spec['label']),
+            'title': search_text(get(field) for field in spec['title']),
+            'body': search_text(get(field) for field in spec['body']),
+        })
+    for chunk in _chunks([item_id for item_id, _ in items]):
+        if dialect == 'sqlite':
+            connection.execute(db.text('DELETE FROM search_index WHERE rowid IN :rowids').bindparams(
+                db.bindparam('rowids', expanding=True)), {'rowids': [item_id * 8 + code for item_id in chunk]})
+        else:
+            connection.execute(db.text('DELETE FROM search_index WHERE entity = :entity AND entity_id IN :ids').bindparams(
+                db.bindparam('ids', expanding=True)), {'entity': entity, 'ids': chunk})
+    if not rows:
+        return
+    if dialect == 'sqlite':
+        connection.execute(db.text(
+            'INSERT INTO search_index (rowid, entity, entity_id, label, title, body) '
+            'VALUES (:rowid, :entity, :entity_id, :label, :title, :body)'
+        ), rows)
+    else:
+        connection.execute(db.text(
+            "INSERT INTO search_index (entity, entity_id, label, document) VALUES (:entity, :entity_id, :label, "
+            "setweight(to_tsvector('simple', :title), 'A') || setweight(to_tsvector('simple', :body), 'B'))"
+        ), rows)
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    for statement in SEARCH_INDEX_DDL.get(connection.dialect.name, ()):
+        connection.exec_driver_sql(statement)
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name in SEARCH_INDEX_DDL:
+        connection.exec_driver_sql('DROP TABLE IF EXISTS search_index')
+
+# Write tracking
+def _increment_row(table, name, column, amount, connection):
+    """הוספת amount לעמודה בשורה לפי name (upsert) על חיבור הטרנזקציה הנוכחית"""
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        stmt = insert(table).values({'name': name, column: amount})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={column: table.c[column] + amount}
+        )
+        connection.execute(stmt)
+        return
+    result = connection.execute(
+        table.update().where(table.c.name == name).values({column: table.c[column] + amount})
+    )
+    if not result.rowcount:
+        connection.execute(table.insert().values({'name': name, column: amount}))
+
+def _bump_versions(connection, tables):
+    for table in sorted(tables):
+        _increment_row(CollectionVersion.__table__, table, 'version', 1, connection)
+
+def _record_sync_changes(connection, changes):
+    """רישום השינוי האחרון של כל רשומה ביומן הסנכרון - changes: {(entity, id): deleted}
+
+    חייב לרוץ אחרי קידום הגרסה של sync_change: נעילת השורה שלה מסדרת את הכותבים,
+    כך שסדר ה-seq תואם לסדר ה-commit וסנכרון לא מדלג על שינוי שטרם נכתב.
+    """
+    table = SyncChange.__table__
+    by_entity = {}
+    for entity, entity_id in changes:
+        by_entity.setdefault(entity, []).append(entity_id)
+    for entity, ids in by_entity.items():
+        for chunk in _chunks(ids):
+            connection.execute(table.delete().where(table.c.entity == entity, table.c.entity_id.in_(chunk)))
+    now = datetime.utcnow()
+    connection.execute(table.insert(), [
+        {'entity': entity, 'entity_id': entity_id, 'deleted': deleted, 'changed_at': now}
+        for (entity, entity_id), deleted in sorted(changes.items())
+    ])
+
+def _record_version_bumps(session, connection, tables):
+    """שמירת מעבר הגרסאות (לפני, אחרי) של טבלאות עם אינדקס בזיכרון - לעדכונו אחרי commit"""
+    watched = [table for table in tables if table in SpatialIndex.by_table]
+    if not watched:
+        return
+    bumps = session.info.setdefault('version_bumps', {})
+    table = CollectionVersion.__table__
+    for name, version in connection.execute(
+        db.select(table.c.name, table.c.version).where(table.c.name.in_(watched))
+    ):
+        # כל קריאה ל-_bump_versions מקדמת כל טבלה ב-1
+        before = bumps[name][0] if name in bumps else version - 1
+        bumps[name] = (before, version)
+
+def stage_index_changes(session, model, rows):
+    """שינויים לאינדקס המרחבי של הטבלה - מוחלים אחרי commit יחד עם קידום הגרסה
+
+    rows: (id, name, latitude, longitude) לשורה שנוספה/עודכנה, או (id, None) לשורה שנמחקה
+    """
+    if not rows:
+        return
+    staged = session.info.setdefault('index_changes', {}).setdefault(model.__tablename__, {})
+    for item_id, *entry in rows:
+        staged[item_id] = tuple(entry) if entry != [None] else None
+
+def _write_changes(session, tables, sync_changes):
+    """רישום הטבלאות והרשומות שהשתנו - הגרסאות ויומן הסנכרון נכתבים לפני ה-commit"""
+    session.info.setdefault('changed_tables', set()).update(tables)
+    session.info.setdefault('sync_changes', {}).update(sync_changes)
+
+@event.listens_for(db.session, 'before_commit')
+def _write_shared_rows(session):
+    """כתיבת השורות שכל הכותבים מעדכנים (מונים, גרסאות טבלאות, יומן הסנכרון) רק לפני ה-commit
+
+    כך הנעילות עליהן מוחזקות לזמן קצר, ונתפסות תמיד באותו סדר - אחרי השורות של הבקשה עצמה,
+    מונים לפי שם ואז גרסאות לפי שם טבלה - בלי deadlock בין כתיבות במקביל.
+    """
+    if session.in_nested_transaction():
+        return
+    session.flush()
+    counters = session.info.pop('counter_changes', {})
+    tables = session.info.pop('changed_tables', set())
+    sync_changes = session.info.pop('sync_changes', {})
+    if not (counters or tables):
+        return
+    connection = session.connection()
+    for name, amount in sorted(counters.items()):
+        if amount:
+            _increment_row(DashboardCounter.__table__, name, 'value', amount, connection)
+    if sync_changes:
+        tables = tables | {SyncChange.__tablename__}
+    if tables:
+        _bump_versions(connection, tables)
+        _record_version_bumps(session, connection, tables)
+    if sync_changes:
+        _record_sync_changes(connection, sync_changes)
+
+def team_room(team_id):
+    return f'team:{team_id}'
+
+def change_rooms(model, item_id):
+    """החדרים שמקבלים אירוע שינוי: חדר סוג הישות, ולצוותים גם חדר הצוות עצמו"""
+    rooms = [PUSH_ROOMS[model]]
+    if model is Team:
+        rooms.append(team_room(item_id))
+    return rooms
+
+def _change_event(obj, op):
+    """אירוע שינוי מצומצם: רשומה מלאה ביצירה, רק השדות שהשתנו בעדכון, מזהה בלבד במחיקה"""
+    change = {'entity': PUSH_ROOMS[type(obj)], 'op': op, 'id': obj.id}
+    if op == 'created':
+        change['data'] = obj.to_dict()
+    elif op == 'updated':
+        changes = {
+            attr.key: serialize_value(attr.value)
+            for attr in db.inspect(obj).attrs if attr.history.has_changes()
+        }
+        if not changes:
+            return None
+        change['changes'] = changes
+    return change
+
+def queue_change_events(session, events):
+    """אירועים נשלחים רק אחרי commit מוצלח ונזרקים ב-rollback"""
+    session.info.setdefault('change_events', []).extend(change for change in events if change)
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_change_events(session):
+    index_changes = session.info.pop('index_changes', {})
+    for name, (before, after) in session.info.pop('version_bumps', {}).items():
+        SpatialIndex.by_table[name].committed(before, after, index_changes.get(name, {}))
+    for change in session.info.pop('change_events', []):
+        for room in change_rooms(PUSH_ENTITIES[change['entity']], change.get('id')):
+            socketio.emit('change', change, to=room)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_change_events(session):
+    # אינדקס שנטען בתוך הטרנזקציה עלול להכיל שורות שבוטלו
+    changed = set(session.info.pop('version_bumps', {})) | session.info.pop('changed_tables', set())
+    for name in changed & set(SpatialIndex.by_table):
+        SpatialIndex.by_table[name].reset()
+    for key in ('index_changes', 'change_events', 'counter_changes', 'sync_changes'):
+        session.info.pop(key, None)
+
+@event.listens_for(db.session, 'after_commit')
+def _stick_to_primary(db_session):
+    # העותק עוד לא ראה את הכתיבה - הבקשות הבאות של המשתמש יקראו מהמסד הראשי
+    if db_session.info.get('primary') and has_request_context():
+        session['db_write_at'] = time.time()
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _reset_routing(db_session, transaction):
+    if transaction.parent is None:
+        db_session.info.pop('primary', None)
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_list_fields(session, flush_context):
+    changed = {}
+    for obj in session.new:
+        if type(obj) in LIST_FIELDS:
+            changed.setdefault(type(obj), []).append((obj.id, getattr(obj, LIST_FIELDS[type(obj)]['field'])))
+    for obj in session.dirty:
+        spec = LIST_FIELDS.get(type(obj))
+        if spec and inspect(obj).attrs[spec['field']].history.has_changes():
+            changed.setdefault(type(obj), []).append((obj.id, getattr(obj, spec['field'])))
+    for obj in session.deleted:
+        if type(obj) in LIST_FIELDS:
+            changed.setdefault(type(obj), []).append((obj.id, None))
+    for model, items in changed.items():
+        sync_list_rows(session.connection(), model, items)
+
+@event.listens_for(db.session, 'after_flush')
+def _update_search_index(session, flush_context):
+    changed = {}
+    for obj in session.new:
+        if type(obj) in SEARCH_ENTITIES:
+            changed.setdefault(type(obj), []).append((obj.id, obj))
+    for obj in session.dirty:
+        entity = SEARCH_ENTITIES.get(type(obj))
+        if entity:
+            spec = SEARCH_SPECS[entity]
+            state = inspect(obj)
+            fields = (*spec['title'], *spec['body'], spec['label'])
+            if any(state.attrs[field].history.has_changes() for field in fields):
+                changed.setdefault(type(obj), []).append((obj.id, obj))
+    for obj in session.deleted:
+        if type(obj) in SEARCH_ENTITIES:
+            changed.setdefault(type(obj), []).append((obj.id, None))
+    for model, items in changed.items():
+        update_search_index(session.connection(), model, items)
+
+@event.listens_for(db.session, 'after_flush')
+def _track_changed_tables(session, flush_context):
+    queue_change_events(session, (
+        _change_event(obj, op)
+        for objects, op in ((session.new, 'created'), (session.dirty, 'updated'), (session.deleted, 'deleted'))
+        for obj in objects if type(obj) in PUSH_ROOMS
+    ))
+    written = list(session.new)
+    written.extend(obj for obj in session.dirty if session.is_modified(obj, include_collections=False))
+    for index in SpatialIndex.by_table.values():
+        stage_index_changes(session, index.model, [
+            (obj.id, obj.name, obj.latitude, obj.longitude) for obj in written if type(obj) is index.model
+        ] + [(obj.id, None) for obj in session.deleted if type(obj) is index.model])
+    changed = {obj.__tablename__ for obj in written}
+    changed.update(obj.__tablename__ for obj in session.deleted)
+    sync_changes = {
+        (SYNC_ENTITIES[type(obj)], obj.id): False for obj in written if type(obj) in SYNC_ENTITIES
+    }
+    sync_changes.update(
+        ((SYNC_ENTITIES[type(obj)], obj.id), True) for obj in session.deleted if type(obj) in SYNC_ENTITIES
+    )
+    if changed:
+        _write_changes(session, changed, sync_changes)
+
+def mark_changed(model, ids=()):
+    """קידום גרסת טבלה שנכתבה בכתיבה מרוכזת (שאינה עוברת דרך אובייקטי ה-session)
+
+    ids - מזהי השורות שנוספו/עודכנו, לרישום ביומן הסנכרון
+    """
+    ids = list(ids)
+    sync_changes = {}
+    if model in SYNC_ENTITIES:
+        sync_changes = {(SYNC_ENTITIES[model], item_id): False for item_id in ids}
+    _write_changes(db.session(), {model.__tablename__}, sync_changes)
+    if model in PUSH_ROOMS:
+        change = {'entity': PUSH_ROOMS[model], 'op': 'reload'}
+        if 0 < len(ids) <= PUSH_MAX_IDS:
+            change = {'entity': PUSH_ROOMS[model], 'op': 'updated', 'ids': ids}
+        queue_change_events(db.session, [change])
+
+def data_version(*models):
+    """גרסת הנתונים הנוכחית של הטבלאות הנתונות (שאילתה אחת)"""
+    names = [model.__tablename__ for model in models]
+    versions = dict(db.session.query(CollectionVersion.name, CollectionVersion.version).filter(
+        CollectionVersion.name.in_(names)
+    ))
+    return tuple(versions.get(name, 0) for name in names)
+
+# User cache - ערכי העמודות של משתמשים מחוברים, לפי מזהה
+_user_cache = {}  # user id -> (expires_at, column values)
+_user_cache_lock = threading.Lock()
+
+def cached_user(user_id):
+    """המשתמש כאובייקט מנותק (לא שייך ל-session) מהמטמון, או מהמסד אם פג תוקפו; None אם לא קיים"""
+    now = time.monotonic()
+    entry = _user_cache.get(user_id)
+    if entry is None or entry[0] <= now:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        entry = (now + app.config['USER_CACHE_SECONDS'], values)
+        with _user_cache_lock:
+            _user_cache[user_id] = entry
+    return User(**entry[1])
+
+def invalidate_users(user_ids):
+    with _user_cache_lock:
+        for user_id in user_ids:
+            _user_cache.pop(user_id, None)
+
+@event.listens_for(db.session, 'after_flush')
+def _track_user_changes(session, flush_context):
+    session.info.setdefault('changed_users', set()).update(
+        obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, User)
+    )
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(session):
+    # רק אחרי commit - אחרת בקשה במקביל עלולה לשמור שוב את הערכים הישנים
+    invalidate_users(session.info.pop('changed_users', ()))
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_users', None)
+
 # Flask-Login user loader
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user = cached_user(int(user_id))
+    # משתמש שהושבת מתנתק מיד (ולא רק בהתחברות הבאה)
+    if user is None or not user.is_active:
+        return None
+    return user
 
 # Role-based permission decorator
 def role_required(*allowed_roles):
@@ -367,14 +1185,116 @@ def role_required(*allowed_roles):
         return decorated_function
     return decorator
 
+# Response compression
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/geo+json', 'text/csv', 'text/plain', 'text/html')
+
+def response_encoding():
+    """הקידוד המועדף על הלקוח מבין הנתמכים (br, gzip) או None"""
+    supported = ('br', 'gzip') if brotli is not None else ('gzip',)
+    encoding = max(supported, key=request.accept_encodings.quality)  # בשוויון - br
+    return encoding if request.accept_encodings.quality(encoding) > 0 else None
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+def compress_response(response, encoding):
+    """דחיסת גוף התשובה במקום, אם הוא טקסטואלי ומעל הסף; ל-ETag מתווסף הקידוד (גרסה שונה של אותו משאב)"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if encoding is None or (response.content_length or 0) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.set_data(compress_body(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+@app.after_request
+def _compress_response(response):
+    return compress_response(response, response_encoding())
+
+# Response cache - (ETag, קידוד) -> (גוף, כותרות), LRU מוגבל בגודל כולל
+_response_cache = collections.OrderedDict()
+_response_cache_bytes = 0
+_response_cache_lock = threading.Lock()
+
+def cached_response(key):
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry is None:
+            return None
+        _response_cache.move_to_end(key)
+    body, headers = entry
+    return app.response_class(body, headers=headers)
+
+def cache_response(key, response):
+    global _response_cache_bytes
+    limit = app.config['RESPONSE_CACHE_MB'] * 1024 * 1024
+    body = response.get_data()
+    if len(body) > limit // 4:
+        return
+    with _response_cache_lock:
+        if key in _response_cache:
+            return
+        _response_cache[key] = (body, list(response.headers.items()))
+        _response_cache_bytes += len(body)
+        while _response_cache_bytes > limit:
+            _, (old_body, _) = _response_cache.popitem(last=False)
+            _response_cache_bytes -= len(old_body)
+
+# Conditional GET - ETag לפי גרסאות הטבלאות, 304 בלי לבנות את גוף התשובה
+def conditional(*models, extra=None):
+    """ETag חזק לבקשות GET לפי גרסת הטבלאות, הנתיב ופרמטרי השאילתה
+
+    extra - פונקציה אופציונלית שמחזירה רכיב נוסף למפתח (למשל נתונים תלויי זמן)
+    התשובה נשמרת (דחוסה) במטמון לפי ה-ETag והקידוד - בקשה חוזרת מקבלת אותה בלי בנייה ודחיסה.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+            key = [request.path, sorted(request.args.items(multi=True)), data_version(*models)]
+            if extra is not None:
+                key.append(extra())
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()
+            # כל הקידודים של אותו ETag מייצגים אותם נתונים
+            for tag in (etag, f'{etag}-gzip', f'{etag}-br'):
+                if request.if_none_match.contains(tag):
+                    response = app.response_class(status=304)
+                    response.set_etag(tag)
+                    return response
+            encoding = response_encoding()
+            caching = app.config['RESPONSE_CACHE_MB'] > 0
+            response = cached_response((etag, encoding)) if caching else None
+            if response is not None:
+                return response
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            response.set_etag(etag)
+            compress_response(response, encoding)
+            if caching and not response.is_streamed:
+                cache_response((etag, encoding), response)
+            return response
+        return decorated_function
+    return decorator
+
 # Helper Functions
 
+EARTH_RADIUS_METERS = 6371000  # רדיוס כדור הארץ במטרים
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """חישוב מרחק בין שתי נקודות GPS במטרים (נוסחת Haversine)"""
-    if not all([lat1, lon1, lat2, lon2]):
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
         return None
     
-    R = 6371000  # רדיוס כדור הארץ במטרים
+    R = EARTH_RADIUS_METERS
     
     lat1_rad = math.radians(lat1)
     lat2_rad = math.radians(lat2)
@@ -389,31 +1309,545 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     distance = R * c
     return distance
 
-def find_nearby_items(source_lat, source_lon, items, max_distance=100):
-    """מציאת פריטים קרובים במטרים"""
-    nearby = []
-    for item in items:
-        if item.latitude and item.longitude:
-            distance = calculate_distance(source_lat, source_lon, item.latitude, item.longitude)
-            if distance and distance <= max_distance:
-                nearby.append({
-                    'id': item.id,
-                    'name': item.name if hasattr(item, 'name') else item.cabinet_number,
-                    'distance': round(distance, 1),
-                    'latitude': item.latitude,
-                    'longitude': item.longitude
-                })
-    # מיון לפי מרחק
-    nearby.sort(key=lambda x: x['distance'])
-    return nearby
+def haversine_many(source_lat, source_lon, lats, lons):
+    """מרחק (מטרים) מנקודה אחת לרשימת נקודות - וקטורי כש-numpy זמין"""
+    if np is None:
+        return [calculate_distance(source_lat, source_lon, lat, lon) for lat, lon in zip(lats, lons)]
+    lat1 = math.radians(source_lat)
+    lats2 = np.radians(np.asarray(lats, dtype=float))
+    delta_lat = lats2 - lat1
+    delta_lon = np.radians(np.asarray(lons, dtype=float) - source_lon)
+    a = np.sin(delta_lat / 2) ** 2 + math.cos(lat1) * np.cos(lats2) * np.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def haversine_matrix(lats1, lons1, lats2, lons2):
+    """מטריצת מרחקים (מטרים) בין כל נקודה ברשימה הראשונה לכל נקודה בשנייה"""
+    if np is None:
+        return [haversine_many(lat, lon, lats2, lons2) for lat, lon in zip(lats1, lons1)]
+    lats1 = np.radians(np.asarray(lats1, dtype=float))[:, None]
+    lats2 = np.radians(np.asarray(lats2, dtype=float))[None, :]
+    delta_lat = lats2 - lats1
+    delta_lon = np.radians(np.asarray(lons2, dtype=float)[None, :] - np.asarray(lons1, dtype=float)[:, None])
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lats1) * np.cos(lats2) * np.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+class SpatialIndex:
+    """אינדקס מרחבי בזיכרון (רשת תאים) לחיפוש פריטים לפי רדיוס
+
+    מחזיק גם מערכי קואורדינטות (numpy) לחישובי מרחק מרוכזים, נבנים מחדש אחרי כתיבה.
+    האינדקס זוכר את גרסת הטבלה שממנה נבנה; כתיבה מתהליך אחר (גרסה לא מוכרת) גורמת לטעינה מחדש.
+    """
+
+    CELL_SIZE = 0.01  # גודל תא במעלות (~1.1 ק"מ)
+    METERS_PER_DEGREE = 111320
+    BLOCK_SIZE = 256  # מספר נקודות מקור בכל חישוב מטריצה
+
+    by_table = {}  # table name -> index
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.RLock()
+        self._cells = {}
+        self._points = {}
+        self._arrays = None
+        self._loaded = False
+        self._version = None
+        SpatialIndex.by_table[model.__tablename__] = self
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.CELL_SIZE)), int(math.floor(lon / self.CELL_SIZE)))
+
+    def _ensure_loaded(self):
+        version = data_version(self.model)[0]
+        if self._loaded and self._version == version:
+            return
+        with self._lock:
+            if self._loaded and self._version == version:
+                return
+            self.reset()
+            rows = db.session.query(
+                self.model.id, self.model.name, self.model.latitude, self.model.longitude
+            ).filter(self.model.latitude.isnot(None), self.model.longitude.isnot(None)).all()
+            for row in rows:
+                self._insert(row.id, row.name, row.latitude, row.longitude)
+            self._version = version
+            self._loaded = True
+
+    def committed(self, before, after, changes):
+        """כתיבה מקומית קידמה את גרסת הטבלה מ-before ל-after - החלת השינויים שלה וקידום הגרסה יחד
+
+        changes: {id: (name, latitude, longitude) או None למחיקה}.
+        אם האינדקס לא היה בגרסה before - פספס כתיבה של תהליך אחר, ונטען מחדש בשימוש הבא.
+        """
+        with self._lock:
+            if self._loaded and self._version == before:
+                for item_id, entry in changes.items():
+                    self._discard(item_id)
+                    if entry is not None:
+                        self._insert(item_id, *entry)
+                self._version = after
+            else:
+                self._loaded = False
+
+    def _insert(self, item_id, name, lat, lon):
+        if lat is None or lon is None:
+            return
+        cell = self._cell(lat, lon)
+        self._points[item_id] = (cell, name, lat, lon)
+        self._cells.setdefault(cell, set()).add(item_id)
+        self._arrays = None
+
+    def _discard(self, item_id):
+        entry = self._points.pop(item_id, None)
+        if entry:
+            self._arrays = None
+            bucket = self._cells.get(entry[0])
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del self._cells[entry[0]]
+
+    def _get_arrays(self):
+        """(ids, names, lats, lons) של כל הפריטים - נשמר עד לכתיבה הבאה"""
+        if self._arrays is None:
+            ids = list(self._points)
+            names = [self._points[item_id][1] for item_id in ids]
+            lats = [self._points[item_id][2] for item_id in ids]
+            lons = [self._points[item_id][3] for item_id in ids]
+            if np is not None:
+                lats = np.asarray(lats, dtype=float)
+                lons = np.asarray(lons, dtype=float)
+            self._arrays = (ids, names, lats, lons)
+        return self._arrays
+
+    def reset(self):
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            self._arrays = None
+            self._loaded = False
+
+    def _deltas(self, lat, max_distance):
+        delta_lat = max_distance / self.METERS_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        return delta_lat, max_distance / (self.METERS_PER_DEGREE * cos_lat)
+
+    def _candidates(self, lat, lon, max_distance):
+        """(ids, names, lats, lons) של הפריטים בתאים החופפים לתיבה התוחמת"""
+        delta_lat, delta_lon = self._deltas(lat, max_distance)
+        min_cell = self._cell(lat - delta_lat, lon - delta_lon)
+        max_cell = self._cell(lat + delta_lat, lon + delta_lon)
+        cell_count = (max_cell[0] - min_cell[0] + 1) * (max_cell[1] - min_cell[1] + 1)
+        # רדיוס גדול מאוד - סריקה ישירה זולה יותר ממעבר על תאים ריקים
+        if cell_count > len(self._cells):
+            return self._get_arrays()
+        ids, names, lats, lons = [], [], [], []
+        for cell_lat in range(min_cell[0], max_cell[0] + 1):
+            for cell_lon in range(min_cell[1], max_cell[1] + 1):
+                for item_id in self._cells.get((cell_lat, cell_lon), ()):
+                    _, name, item_lat, item_lon = self._points[item_id]
+                    ids.append(item_id)
+                    names.append(name)
+                    lats.append(item_lat)
+                    lons.append(item_lon)
+        return ids, names, lats, lons
+
+    @staticmethod
+    def _collect(ids, names, lats, lons, distances, max_distance):
+        if np is not None:
+            hits = np.nonzero(np.asarray(distances) <= max_distance)[0]
+        else:
+            hits = [i for i, distance in enumerate(distances) if distance is not None and distance <= max_distance]
+        nearby = []
+        for i in hits:
+            nearby.append({
+                'id': ids[i],
+                'name': names[i],
+                'distance': round(float(distances[i]), 1),
+                'latitude': float(lats[i]),
+                'longitude': float(lons[i])
+            })
+        nearby.sort(key=lambda x: (x['distance'], x['id']))
+        return nearby
+
+    def nearby(self, source_lat, source_lon, max_distance=100):
+        """מציאת פריטים ברדיוס נתון (במטרים), ממוינים לפי מרחק"""
+        if source_lat is None or source_lon is None:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            ids, names, lats, lons = self._candidates(source_lat, source_lon, max_distance)
+        if not ids:
+            return []
+        distances = haversine_many(source_lat, source_lon, lats, lons)
+        return self._collect(ids, names, lats, lons, distances, max_distance)
+
+    def nearby_many(self, points, max_distance=100):
+        """פריטים קרובים לכל אחת מנקודות המקור - {source_id: [...]}
+
+        points - רצף של (id, lat, lon). עם numpy הנקודות ממוינות לפי תא ומחושבות
+        בבלוקים מול הפריטים שבתיבה התוחמת של הבלוק (מטריצת מרחקים אחת לבלוק).
+        """
+        points = [(point_id, lat, lon) for point_id, lat, lon in points if lat is not None and lon is not None]
+        if np is None:
+            return {point_id: self.nearby(lat, lon, max_distance) for point_id, lat, lon in points}
+        self._ensure_loaded()
+        with self._lock:
+            ids, names, lats, lons = self._get_arrays()
+        result = {}
+        if not ids:
+            return {point_id: [] for point_id, _, _ in points}
+        points.sort(key=lambda point: self._cell(point[1], point[2]))
+        for start in range(0, len(points), self.BLOCK_SIZE):
+            block = points[start:start + self.BLOCK_SIZE]
+            block_lats = np.array([point[1] for point in block])
+            block_lons = np.array([point[2] for point in block])
+            delta_lat, delta_lon = self._deltas(float(np.abs(block_lats).max()), max_distance)
+            mask = (
+                (lats >= block_lats.min() - delta_lat) & (lats <= block_lats.max() + delta_lat) &
+                (lons >= block_lons.min() - delta_lon) & (lons <= block_lons.max() + delta_lon)
+            )
+            selected = np.nonzero(mask)[0]
+            if not len(selected):
+                result.update((point[0], []) for point in block)
+                continue
+            sub_ids = [ids[i] for i in selected]
+            sub_names = [names[i] for i in selected]
+            sub_lats, sub_lons = lats[selected], lons[selected]
+            matrix = haversine_matrix(block_lats, block_lons, sub_lats, sub_lons)
+            for row, point in enumerate(block):
+                result[point[0]] = self._collect(sub_ids, sub_names, sub_lats, sub_lons, matrix[row], max_distance)
+        return result
+
+hydrant_index = SpatialIndex(Hydrant)
+cabinet_index = SpatialIndex(EquipmentCabinet)
+
+# Proximity links - לכל צד: עמודת המפתח שלו בטבלת הקישורים, הצד השני ועמודת ה-JSON הנגזרת
+PROXIMITY_SIDES = {
+    Hydrant: {'key': 'hydrant_id', 'other_key': 'cabinet_id', 'other': EquipmentCabinet,
+              'other_index': cabinet_index, 'column': 'nearby_cabinets'},
+    EquipmentCabinet: {'key': 'cabinet_id', 'other_key': 'hydrant_id', 'other': Hydrant,
+                       'other_index': hydrant_index, 'column': 'nearby_hydrants'}
+}
+
+def _chunks(values, size=500):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def lock_rows(model, ids, key_share=True):
+    """נעילת שורות לפי סדר המזהים (FOR NO KEY UPDATE, או FOR UPDATE) - מחזיר את המזהים שעדיין קיימים"""
+    locked = set()
+    for chunk in _chunks(sorted(ids)):
+        locked.update(row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(chunk)).order_by(
+            model.id
+        ).with_for_update(key_share=key_share))
+    return locked
+
+def relink_proximity(model, items):
+    """חישוב מחדש של קישורי הקרבה של הפריטים - מחזיר את מזהי השכנים שהושפעו (ישנים וחדשים)"""
+    side = PROXIMITY_SIDES[model]
+    own_key = getattr(ProximityLink, side['key'])
+    other_key = getattr(ProximityLink, side['other_key'])
+    max_distance = app.config['PROXIMITY_DISTANCE_METERS']
+    affected = set()
+    for chunk in _chunks(items):
+        ids = [item.id for item in chunk]
+        affected.update(other_id for (other_id,) in db.session.query(other_key).filter(own_key.in_(ids)))
+        ProximityLink.query.filter(own_key.in_(ids)).delete(synchronize_session=False)
+    points = [(item.id, item.latitude, item.longitude) for item in items]
+    nearby_lists = side['other_index'].nearby_many(points, max_distance)
+    # השכנים ננעלים לפי סדר המזהים לפני הכתיבה אליהם; שכן שנמחק בינתיים לא מקושר
+    existing = lock_rows(side['other'], affected.union(*(
+        (near['id'] for near in nearby) for nearby in nearby_lists.values()
+    )))
+    affected &= existing
+    links = []
+    for item_id, nearby in nearby_lists.items():
+        for near in nearby:
+            if near['id'] in existing:
+                links.append({side['key']: item_id, side['other_key']: near['id'], 'distance': near['distance']})
+                affected.add(near['id'])
+    if links:
+        db.session.execute(db.insert(ProximityLink), links)
+    return affected
+
+def nearby_from_links(model, ids):
+    """בניית רשימות הקרבה (בפורמט שדות nearby_*) מטבלת הקישורים"""
+    side = PROXIMITY_SIDES[model]
+    other = side['other']
+    own_key = getattr(ProximityLink, side['key'])
+    other_key = getattr(ProximityLink, side['other_key'])
+    result = {item_id: [] for item_id in ids}
+    for chunk in _chunks(ids):
+        rows = db.session.query(
+            own_key, other.id, other.name, ProximityLink.distance, other.latitude, other.longitude
+        ).join(other, other.id == other_key).filter(own_key.in_(chunk)).order_by(own_key, ProximityLink.distance)
+        for item_id, other_id, name, distance, lat, lon in rows:
+            result[item_id].append({
+                'id': other_id,
+                'name': name,
+                'distance': distance,
+                'latitude': lat,
+                'longitude': lon
+            })
+    return result
+
+def refresh_nearby_json(model, ids):
+    """כתיבה מרוכזת של שדות ה-JSON הנגזרים עבור הפריטים שהושפעו"""
+    if not ids:
+        return
+    column = PROXIMITY_SIDES[model]['column']
+    lists = nearby_from_links(model, sorted(ids))
+    db.session.execute(db.update(model), [
+        {'id': item_id, column: json.dumps(nearby)} for item_id, nearby in lists.items()
+    ])
+    mark_changed(model, lists.keys())
+
+def sync_proximity(item, previous=None):
+    """עדכון מצטבר של הקרבה אחרי יצירה או עדכון של הידרנט/ארון
+
+    previous - (name, latitude, longitude) לפני העדכון; None ביצירה
+    """
+    model = type(item)
+    side = PROXIMITY_SIDES[model]
+    if previous is not None:
+        name, lat, lon = previous
+        if (lat, lon) == (item.latitude, item.longitude):
+            # המיקום לא השתנה - רק שינוי שם מחייב רענון רשימות השכנים
+            if name != item.name:
+                neighbors = [near['id'] for near in nearby_from_links(model, [item.id])[item.id]]
+                refresh_nearby_json(side['other'], lock_rows(side['other'], neighbors))
+            return
+    if item.id is None:
+        db.session.flush()
+    affected = relink_proximity(model, [item])
+    setattr(item, side['column'], json.dumps(nearby_from_links(model, [item.id])[item.id]))
+    refresh_nearby_json(side['other'], affected)
+
+def remove_proximity(model, item_id):
+    """מחיקת קישורי הקרבה של פריט שנמחק ורענון השכנים שלו בלבד"""
+    side = PROXIMITY_SIDES[model]
+    own_key = getattr(ProximityLink, side['key'])
+    other_key = getattr(ProximityLink, side['other_key'])
+    affected = lock_rows(side['other'], [other_id for (other_id,) in db.session.query(other_key).filter(own_key == item_id)])
+    ProximityLink.query.filter(own_key == item_id).delete(synchronize_session=False)
+    refresh_nearby_json(side['other'], affected)
+
+def backfill_proximity_links():
+    """בניית טבלת הקישורים מאפס ושחזור כל שדות ה-JSON ממנה"""
+    ProximityLink.query.delete()
+    hydrants = db.session.query(Hydrant.id, Hydrant.latitude, Hydrant.longitude).filter(
+        Hydrant.latitude.isnot(None), Hydrant.longitude.isnot(None)
+    ).all()
+    relink_proximity(Hydrant, hydrants)
+    refresh_nearby_json(Hydrant, [hydrant_id for (hydrant_id,) in db.session.query(Hydrant.id)])
+    refresh_nearby_json(EquipmentCabinet, [cabinet_id for (cabinet_id,) in db.session.query(EquipmentCabinet.id)])
+
+# סדר נעילת השורות בכתיבה שנוגעת בשני צדי הקרבה - זהה לכל הכותבים
+PROXIMITY_LOCK_ORDER = (Hydrant, EquipmentCabinet)
+PROXIMITY_FIELDS = ('name', 'latitude', 'longitude')  # שדות שעדכונם כותב גם לשכנים
+PROXIMITY_LOCK_ATTEMPTS = 3
+
+def proximity_neighbors(item, data=None):
+    """מזהי השכנים שעדכון הקרבה של הפריט יכתוב אליהם: הקיימים, ועם data (גוף PUT) גם אלה שליד המיקום החדש"""
+    side = PROXIMITY_SIDES[type(item)]
+    own_key = getattr(ProximityLink, side['key'])
+    other_key = getattr(ProximityLink, side['other_key'])
+    ids = {other_id for (other_id,) in db.session.query(other_key).filter(own_key == item.id)}
+    if data:
+        lat = data.get('latitude', item.latitude)
+        lon = data.get('longitude', item.longitude)
+        max_distance = app.config['PROXIMITY_DISTANCE_METERS']
+        ids.update(near['id'] for near in side['other_index'].nearby(lat, lon, max_distance))
+    return ids
+
+def get_for_update_or_404(model, item_id):
+    """השורה לפי מזהה; בבקשת כתיבה היא נעולה עד סוף הטרנזקציה (FOR UPDATE, בלי השפעה ב-SQLite)
+
+    כך ערכים שנקראו (למשל הסטטוס הקודם לעדכון המונים) לא משתנים עד ה-commit, וכותבים
+    של שורות אחרות אינם ממתינים. בהידרנט/ארון שעדכונו כותב גם לשכנים ננעלים גם השכנים,
+    לפי PROXIMITY_LOCK_ORDER ומזהה - שני עדכונים של שכנים במקביל לא ננעלים זה על זה (deadlock).
+    """
+    item = model.query.get_or_404(item_id)
+    if request.method not in WRITE_METHODS:
+        return item
+    # מחיקה צריכה FOR UPDATE; עדכון מסתפק ב-FOR NO KEY UPDATE, שלא חוסם הוספת קישורים (foreign key) לשורה
+    lock = {'key_share': request.method != 'DELETE'}
+    data = None
+    if model in PROXIMITY_SIDES and request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+    locked_query = model.query.populate_existing().with_for_update(**lock)
+    if model not in PROXIMITY_SIDES or (data is not None and not any(field in data for field in PROXIMITY_FIELDS)):
+        return locked_query.get_or_404(item_id)
+    for attempt in range(PROXIMITY_LOCK_ATTEMPTS):
+        neighbors = proximity_neighbors(item, data)
+        for locked in PROXIMITY_LOCK_ORDER:
+            if locked is model:
+                item = locked_query.get_or_404(item_id)  # נמחק בינתיים - 404
+            else:
+                lock_rows(locked, neighbors)
+        # השכנים חושבו לפני נעילת הפריט - אם הוא הוזז בינתיים, נועלים מחדש (עוד לא נכתב דבר)
+        if proximity_neighbors(item, data) <= neighbors or attempt == PROXIMITY_LOCK_ATTEMPTS - 1:
+            return item
+        db.session.rollback()
+        item = model.query.get_or_404(item_id)
+
+# מודלים שנספרים בדשבורד: קידומת המונה והשדות שלפיהם סופרים
+COUNTED_MODELS = {
+    Team: ('teams', ('status',)),
+    Hydrant: ('hydrants', ('status',)),
+    EquipmentCabinet: ('equipment_cabinets', ('status',)),
+    EquipmentItem: ('equipment_items', ('status',)),
+    Task: ('tasks', ('status', 'priority')),
+    Volunteer: ('volunteers', ('status',)),
+    Activity: ('activities', ('status',))
+}
+
+def _counter_value(obj, field):
+    value = getattr(obj, field)
+    if value is None:
+        # ערך ברירת המחדל של העמודה מוצב רק ב-INSERT
+        default = obj.__table__.c[field].default
+        if default is not None and default.is_scalar:
+            value = default.arg
+    return value
+
+def stage_counter_changes(changes):
+    """שינויי המונים של הטרנזקציה - נכתבים יחד לפני ה-commit (_write_shared_rows)"""
+    pending = db.session.info.setdefault('counter_changes', {})
+    for name, amount in changes.items():
+        pending[name] = pending.get(name, 0) + amount
+
+def update_counters(obj, delta=0):
+    """עדכון מוני הדשבורד בתוך הטרנזקציה של הכתיבה
+
+    delta=1 ליצירה, delta=-1 למחיקה, 0 לעדכון (לפי היסטוריית השדות)
+    """
+    if not app.config['DASHBOARD_COUNTERS']:
+        return
+    prefix, fields = COUNTED_MODELS[type(obj)]
+    changes = {}
+    if delta:
+        changes[f'{prefix}.total'] = delta
+        for field in fields:
+            value = _counter_value(obj, field)
+            if value is not None:
+                changes[f'{prefix}.{field}.{value}'] = delta
+    else:
+        state = db.inspect(obj)
+        for field in fields:
+            history = state.attrs[field].history
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if not history.added or old == new:
+                continue
+            if old is not None:
+                changes[f'{prefix}.{field}.{old}'] = changes.get(f'{prefix}.{field}.{old}', 0) - 1
+            if new is not None:
+                changes[f'{prefix}.{field}.{new}'] = changes.get(f'{prefix}.{field}.{new}', 0) + 1
+    stage_counter_changes(changes)
+
+def update_counters_bulk(model, rows):
+    """עדכון מונים עבור שורות שהוכנסו בכתיבה מרוכזת"""
+    if not app.config['DASHBOARD_COUNTERS'] or not rows:
+        return
+    prefix, fields = COUNTED_MODELS[model]
+    changes = {f'{prefix}.total': len(rows)}
+    for row in rows:
+        for field in fields:
+            value = row.get(field)
+            if value is not None:
+                changes[f'{prefix}.{field}.{value}'] = changes.get(f'{prefix}.{field}.{value}', 0) + 1
+    stage_counter_changes(changes)
+
+def lock_counters(connection):
+    """נעילת טבלת המונים עד סוף הטרנזקציה - כותבים שכבר עדכנו מונה מסיימים קודם, חדשים ממתינים"""
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('LOCK TABLE dashboard_counter IN SHARE ROW EXCLUSIVE MODE')
+    elif connection.dialect.name == 'sqlite':
+        # כתיבה ריקה תופסת את נעילת הכתיבה של הקובץ
+        connection.exec_driver_sql('UPDATE dashboard_counter SET value = value WHERE 0')
+
+def _write_counters(connection, values, overwrite):
+    """כתיבת ערכי המונים (upsert); overwrite=False משאיר מונים קיימים כמו שהם"""
+    table = DashboardCounter.__table__
+    rows = [{'name': name, 'value': value} for name, value in sorted(values.items())]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite_insert if dialect == 'sqlite' else postgresql_insert)(table)
+        if overwrite:
+            stmt = stmt.on_conflict_do_update(index_elements=['name'], set_={'value': stmt.excluded.value})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=['name'])
+        connection.execute(stmt, rows)
+        return
+    existing = {name for (name,) in connection.execute(db.select(table.c.name))}
+    for row in rows:
+        if row['name'] not in existing:
+            connection.execute(table.insert().values(row))
+        elif overwrite:
+            connection.execute(table.update().where(table.c.name == row['name']).values(value=row['value']))
+
+def reconcile_counters(seed=False):
+    """חישוב מחדש של כל המונים מהטבלאות (תיקון סטיות)
+
+    הספירה והכתיבה רצות בטרנזקציה אחת, אחרי נעילת טבלת המונים, כך שהוספה שבוצעה
+    במקביל לא הולכת לאיבוד. seed=True - אתחול ראשון, לא דורס מונים שכבר נכתבו.
+    """
+    db.session.commit()  # הנעילה חייבת להיות הפעולה הראשונה בטרנזקציה
+    use_primary()
+    connection = db.session.connection()
+    lock_counters(connection)
+    values = {}
+    for model, (prefix, fields) in COUNTED_MODELS.items():
+        values[f'{prefix}.total'] = db.session.query(db.func.count()).select_from(model).scalar()
+        for field in fields:
+            column = getattr(model, field)
+            for value, count in db.session.query(column, db.func.count()).group_by(column).all():
+                if value is not None:
+                    values[f'{prefix}.{field}.{value}'] = count
+    table = DashboardCounter.__table__
+    current = dict(connection.execute(db.select(table.c.name, table.c.value)).all())
+    if seed:
+        target = {**values, **current}
+    else:
+        # ערכים שכבר אין להם שורות מתאפסים
+        target = {**dict.fromkeys(current, 0), **values}
+    if target != current:
+        if not seed:
+            connection.execute(table.update().where(table.c.name.notin_(list(values)), table.c.value != 0).values(value=0))
+        _write_counters(connection, values, overwrite=not seed)
+        mark_changed(DashboardCounter)  # ה-ETag של הסטטיסטיקות תלוי בגרסת המונים
+    db.session.commit()
+    return values
+
+def read_counters():
+    """קריאת כל המונים בשאילתה אחת (עם אתחול בפעם הראשונה)"""
+    counters = dict(db.session.query(DashboardCounter.name, DashboardCounter.value).all())
+    if not counters:
+        counters = reconcile_counters(seed=True)
+    return counters
+
+def counters_reconcile_loop():
+    """משימת רקע - תיאום מחזורי של מוני הדשבורד"""
+    while True:
+        socketio.sleep(app.config['COUNTERS_RECONCILE_SECONDS'])
+        with app.app_context():
+            try:
+                reconcile_counters()
+            except Exception as e:
+                db.session.rollback()
+                print(f'Counter reconciliation failed: {e}')
 
 def check_inspection_alerts():
     """בדיקת התראות לפריטים שטעונים בדיקה"""
     alerts = []
+    now = datetime.utcnow()
     
     # בדיקת הידרנטים שלא נבדקו 5.5 חודשים
-    six_months_ago = datetime.utcnow() - timedelta(days=165)  # ~5.5 חודשים
-    hydrants_need_check = Hydrant.query.filter(
+    six_months_ago = now - timedelta(days=165)  # ~5.5 חודשים
+    hydrants_need_check = db.session.query(Hydrant.id, Hydrant.name).filter(
         (Hydrant.last_inspection_date == None) | (Hydrant.last_inspection_date < six_months_ago)
     ).all()
     
@@ -426,31 +1860,38 @@ def check_inspection_alerts():
             'message': f'הידרנט {hydrant.name} טעון בדיקה תקופתית'
         })
     
-    # בדיקת מטפים עם תאריך תפוגה מתקרב (30 ימים)
-    thirty_days_ahead = datetime.utcnow() + timedelta(days=30)
-    expiring_items = EquipmentItem.query.filter(
+    # בדיקת מטפים עם תאריך תפוגה מתקרב (30 ימים) - כולל שם הארון ב-JOIN
+    thirty_days_ahead = now + timedelta(days=30)
+    expiring_items = db.session.query(
+        EquipmentItem.id,
+        EquipmentItem.item_name,
+        EquipmentItem.expiry_date,
+        EquipmentCabinet.name.label('cabinet_name')
+    ).outerjoin(
+        EquipmentCabinet, EquipmentItem.cabinet_id == EquipmentCabinet.id
+    ).filter(
         EquipmentItem.item_type == 'extinguisher',
         EquipmentItem.expiry_date != None,
         EquipmentItem.expiry_date <= thirty_days_ahead
     ).all()
     
     for item in expiring_items:
-        cabinet = EquipmentCabinet.query.get(item.cabinet_id)
+        cabinet_name = item.cabinet_name or 'Unknown'
         alerts.append({
             'type': 'equipment_expiry',
-            'severity': 'critical' if item.expiry_date <= datetime.utcnow() else 'warning',
+            'severity': 'critical' if item.expiry_date <= now else 'warning',
             'item_id': item.id,
-            'cabinet_name': cabinet.name if cabinet else 'Unknown',
+            'cabinet_name': cabinet_name,
             'item_name': item.item_name,
             'expiry_date': item.expiry_date.isoformat(),
-            'message': f'מטף {item.item_name} בארון {cabinet.name if cabinet else "Unknown"} פג/פג תוקף'
+            'message': f'מטף {item.item_name} בארון {cabinet_name} פג/פג תוקף'
         })
     
     # בדיקת משימות שעברו דדליין
-    overdue_tasks = Task.query.filter(
+    overdue_tasks = db.session.query(Task.id, Task.title, Task.priority).filter(
         Task.status.in_(['new', 'in_progress', 'waiting']),
         Task.due_date != None,
-        Task.due_date < datetime.utcnow()
+        Task.due_date < now
     ).all()
     
     for task in overdue_tasks:
@@ -464,8 +1905,255 @@ def check_inspection_alerts():
     
     return alerts
 
+# Alerts cache
+ALERT_MODELS = (Hydrant, EquipmentCabinet, EquipmentItem, Task)
+_alerts_cache = {'version': None, 'expires_at': None, 'alerts': None}
+_alerts_cache_lock = threading.Lock()
+
+def next_alert_change(now):
+    """המועד הקרוב שבו התראה תיווצר או תשנה חומרה ללא כתיבה לנתונים"""
+    six_months_ago = now - timedelta(days=165)
+    thirty_days_ahead = now + timedelta(days=30)
+    crossings = []
+    
+    # הידרנט שייכנס לחלון הבדיקה
+    oldest_inspection = db.session.query(db.func.min(Hydrant.last_inspection_date)).filter(
+        Hydrant.last_inspection_date >= six_months_ago
+    ).scalar()
+    if oldest_inspection:
+        crossings.append(oldest_inspection + timedelta(days=165))
+    
+    # מטף שייכנס לחלון 30 הימים, או שיפוג (warning -> critical)
+    entering, expiring = db.session.query(
+        db.func.min(db.case((EquipmentItem.expiry_date > thirty_days_ahead, EquipmentItem.expiry_date))),
+        db.func.min(db.case((EquipmentItem.expiry_date > now, EquipmentItem.expiry_date)))
+    ).filter(EquipmentItem.item_type == 'extinguisher').one()
+    if entering:
+        crossings.append(entering - timedelta(days=30))
+    if expiring:
+        crossings.append(expiring)
+    
+    # משימה פתוחה שתעבור את תאריך היעד
+    next_due = db.session.query(db.func.min(Task.due_date)).filter(
+        Task.status.in_(['new', 'in_progress', 'waiting']),
+        Task.due_date >= now
+    ).scalar()
+    if next_due:
+        crossings.append(next_due)
+    
+    return min(crossings) if crossings else None
+
+def get_inspection_alerts():
+    """התראות מהמטמון - מחושבות מחדש רק אחרי כתיבה רלוונטית או חציית סף"""
+    now = datetime.utcnow()
+    version = data_version(*ALERT_MODELS)
+    with _alerts_cache_lock:
+        if _alerts_cache['version'] == version and now < _alerts_cache['expires_at']:
+            return _alerts_cache['alerts']
+        alerts = check_inspection_alerts()
+        expires_at = now + timedelta(seconds=app.config['ALERTS_CACHE_SECONDS'])
+        crossing = next_alert_change(now)
+        if crossing and crossing < expires_at:
+            expires_at = crossing
+        _alerts_cache.update(version=version, expires_at=expires_at, alerts=alerts)
+        return alerts
+
+# List pagination and projection
+MAX_PAGE_SIZE = 1000
+
+def serialize_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def encode_cursor(values):
+    raw = json.dumps([serialize_value(v) for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    return json.loads(raw)
+
+_row_fields = {}
+
+def row_fields(model):
+    """שדות התשובה של המודל - המפתחות של to_dict, נגזרים פעם אחת ממופע ריק"""
+    if model not in _row_fields:
+        _row_fields[model] = list(model().to_dict())
+    return _row_fields[model]
+
+def row_dicts(query, model, extra_columns=()):
+    """כמו [row.to_dict() for row in query], ישירות מ-tuple העמודות - בלי בניית אובייקטי ORM
+
+    תאריכים נשארים datetime (ספק ה-JSON מסדר אותם ב-ISO 8601). מחזיר גם את ערכי extra_columns של כל שורה.
+    """
+    names = row_fields(model)
+    columns = [model.__table__.columns[name] for name in names]
+    rows = query.with_entities(*columns, *extra_columns).all()
+    return [dict(zip(names, row)) for row in rows], [row[len(names):] for row in rows]
+
+def list_response(query, model, newest_first_by=None):
+    """החזרת רשימה עם עימוד keyset (limit/after) והטלת שדות (fields)
+
+    ללא limit מוחזרת הרשימה המלאה כמו קודם. הסמן לעמוד הבא מוחזר בכותרת X-Next-Cursor.
+    """
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
+    fields = request.args.get('fields')
+    
+    if limit is not None and not 0 < limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    
+    columns = None
+    if fields:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in model.__table__.columns]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+        columns = [model.__table__.columns[name] for name in names]
+    
+    # עמודות המפתח של הסמן: (date, id) בסדר יורד או id בסדר עולה
+    key_columns = [newest_first_by, model.id] if newest_first_by is not None else [model.id]
+    if newest_first_by is not None:
+        query = query.order_by(newest_first_by.desc().nullslast(), model.id.desc())
+    else:
+        query = query.order_by(model.id)
+    
+    if after:
+        try:
+            cursor = decode_cursor(after)
+            if newest_first_by is not None:
+                cursor_date = datetime.fromisoformat(cursor[0]) if cursor[0] else None
+                cursor_id = int(cursor[1])
+            else:
+                cursor_id = int(cursor[0])
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if newest_first_by is None:
+            query = query.filter(model.id > cursor_id)
+        elif cursor_date is None:
+            query = query.filter(newest_first_by == None, model.id < cursor_id)
+        else:
+            query = query.filter(db.or_(
+                newest_first_by < cursor_date,
+                db.and_(newest_first_by == cursor_date, model.id < cursor_id),
+                newest_first_by == None
+            ))
+    
+    if limit is not None:
+        query = query.limit(limit + 1)
+    
+    if columns is not None:
+        rows = query.with_entities(*columns, *key_columns).all()
+        items = [{column.name: value for column, value in zip(columns, row)} for row in rows]
+        keys = [row[len(columns):] for row in rows]
+    else:
+        items, keys = row_dicts(query, model, key_columns)
+    
+    next_cursor = None
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(keys[limit - 1])
+    
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def alerts_expiry():
+    """רכיב ETag להתראות - מתחלף כשהמטמון פג (חציית סף זמן)"""
+    get_inspection_alerts()
+    return _alerts_cache['expires_at']
+
 # API Routes
 
+# Password hashing pool
+class PasswordPoolBusy(Exception):
+    pass
+
+class PasswordPool:
+    """מאגר מוגבל לחישובי סיסמה - hashlib משחרר את ה-GIL, כך ששאר הבקשות ממשיכות לרוץ
+
+    ב-gevent/eventlet החישוב עובר ל-thread אמיתי (אחרת היה חוסם את לולאת האירועים).
+    """
+
+    def __init__(self):
+        self._slots = None
+        self._run = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        mode = app.config['SOCKETIO_ASYNC_MODE']
+        if mode == 'gevent':
+            from gevent.threadpool import ThreadPool
+            pool = ThreadPool(workers)
+            self._run = lambda func, *args: pool.apply(func, args)
+        elif mode == 'eventlet':
+            from eventlet import tpool  # גודל המאגר: EVENTLET_THREADPOOL_SIZE
+            self._run = tpool.execute
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+            self._run = lambda func, *args: executor.submit(func, *args).result()
+        self._slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_HASH_QUEUE'])
+
+    def run(self, func, *args):
+        """הרצת func במאגר והמתנה לתוצאה; PasswordPoolBusy אם התור מלא"""
+        if self._run is None:
+            with self._lock:
+                if self._run is None:
+                    self._start()
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy()
+        try:
+            return self._run(func, *args)
+        finally:
+            self._slots.release()
+
+password_pool = PasswordPool()
+
+# Login throttling - זמני הכישלונות האחרונים לכל מפתח (שם משתמש / IP), בזיכרון התהליך
+_login_failures = {}  # ('user', name) / ('ip', address) -> deque of timestamps
+_login_failures_lock = threading.Lock()
+LOGIN_THROTTLE_MAX_KEYS = 10000
+
+def _login_keys(username):
+    return (('user', username.lower()), app.config['LOGIN_MAX_FAILURES']), \
+           (('ip', request.remote_addr), app.config['LOGIN_MAX_FAILURES_PER_IP'])
+
+def login_retry_after(username):
+    """שניות עד שמותר לנסות שוב, או 0 אם הניסיון מותר"""
+    now = time.monotonic()
+    window = app.config['LOGIN_FAILURE_WINDOW_SECONDS']
+    wait = 0
+    with _login_failures_lock:
+        for key, limit in _login_keys(username):
+            failures = _login_failures.get(key)
+            while failures and failures[0] <= now - window:
+                failures.popleft()
+            if failures and len(failures) >= limit:
+                wait = max(wait, failures[-limit] + window - now)
+    return math.ceil(wait)
+
+def record_login_failure(username):
+    now = time.monotonic()
+    with _login_failures_lock:
+        if len(_login_failures) >= LOGIN_THROTTLE_MAX_KEYS:
+            # ניקוי מפתחות שכל הכישלונות שלהם מחוץ לחלון
+            cutoff = now - app.config['LOGIN_FAILURE_WINDOW_SECONDS']
+            for key in [key for key, failures in _login_failures.items() if failures[-1] <= cutoff]:
+                del _login_failures[key]
+        for key, limit in _login_keys(username):
+            _login_failures.setdefault(key, collections.deque(maxlen=limit)).append(now)
+
+def clear_login_failures(username):
+    with _login_failures_lock:
+        _login_failures.pop(('user', username.lower()), None)
+
+def too_many_requests(message, retry_after, status=429):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -476,6 +2164,12 @@ def register():
     if not data.get('username') or not data.get('password') or not data.get('name'):
         return jsonify({'error': 'Username, password, and name are required'}), 400
 
+    # חישוב הסיסמה לפני השאילתות - כדי לא להחזיק חיבור (וב-SQLite את נעילת הכתיבה) בזמן החישוב
+    try:
+        password_hash = password_pool.run(generate_password_hash, data['password'])
+    except PasswordPoolBusy:
+        return too_many_requests('Server is busy, please try again', 1, status=503)
+
     # Check if username already exists
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'error': 'Username already exists'}), 409
@@ -493,7 +2187,7 @@ def register():
         role=data.get('role', 'observer'),  # Default to observer
         team_id=data.get('team_id')
     )
-    user.set_password(data['password'])
+    user.password_hash = password_hash
 
     db.session.add(user)
     db.session.commit()
@@ -511,11 +2205,24 @@ def login():
     if not data.get('username') or not data.get('password'):
         return jsonify({'error': 'Username and password are required'}), 400
 
+    retry_after = login_retry_after(data['username'])
+    if retry_after:
+        return too_many_requests('Too many failed login attempts, please try again later', retry_after)
+
     # Find user by username
     user = User.query.filter_by(username=data['username']).first()
+    password_hash = user.password_hash if user else None
+    db.session.rollback()  # החיבור חוזר למאגר (וב-SQLite משתחררת נעילת הכתיבה) בזמן חישוב הסיסמה
+
+    try:
+        valid = password_hash is not None and password_pool.run(check_password_hash, password_hash, data['password'])
+    except PasswordPoolBusy:
+        return too_many_requests('Server is busy, please try again', 1, status=503)
 
-    if not user or not user.check_password(data['password']):
+    if not valid:
+        record_login_failure(data['username'])
         return jsonify({'error': 'Invalid username or password'}), 401
+    clear_login_failures(data['username'])
 
     if not user.is_active:
         return jsonify({'error': 'Account is disabled'}), 403
@@ -559,10 +2266,16 @@ def check_auth():
 # Teams
 @app.route('/api/teams', methods=['GET', 'POST'])
 @login_required
+@conditional(Team)
 def teams():
     if request.method == 'GET':
-        teams = Team.query.all()
-        return jsonify([team.to_dict() for team in teams])
+        member = request.args.get('member')
+        
+        query = Team.query
+        if member:
+            query = query.filter(Team.id.in_(list_owner_ids(Team, member)))
+        
+        return list_response(query, Team)
 
     elif request.method == 'POST':
         # Only manager and commander can create teams
@@ -578,13 +2291,14 @@ def teams():
             phone=data.get('phone', '')
         )
         db.session.add(team)
+        update_counters(team, 1)
         db.session.commit()
         return jsonify(team.to_dict()), 201
 
 @app.route('/api/teams/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def team_detail(id):
-    team = Team.query.get_or_404(id)
+    team = get_for_update_or_404(Team, id)
 
     if request.method == 'GET':
         return jsonify(team.to_dict())
@@ -600,6 +2314,7 @@ def team_detail(id):
         team.members = data.get('members', team.members)
         team.status = data.get('status', team.status)
         team.phone = data.get('phone', team.phone)
+        update_counters(team)
         db.session.commit()
         return jsonify(team.to_dict())
 
@@ -608,6 +2323,7 @@ def team_detail(id):
         if current_user.role != 'manager':
             return jsonify({'error': 'Insufficient permissions'}), 403
 
+        update_counters(team, -1)
         db.session.delete(team)
         db.session.commit()
         return '', 204
@@ -615,10 +2331,10 @@ def team_detail(id):
 # Hydrants
 @app.route('/api/hydrants', methods=['GET', 'POST'])
 @login_required
+@conditional(Hydrant)
 def hydrants():
     if request.method == 'GET':
-        hydrants = Hydrant.query.all()
-        return jsonify([hydrant.to_dict() for hydrant in hydrants])
+        return list_response(Hydrant.query, Hydrant)
 
     elif request.method == 'POST':
         # Members and above can create hydrants
@@ -640,20 +2356,17 @@ def hydrants():
             notes=data.get('notes', '')
         )
         
-        # חישוב ארונות קרובים אם יש קואורדינטות
-        if hydrant.latitude and hydrant.longitude:
-            cabinets = EquipmentCabinet.query.all()
-            nearby = find_nearby_items(hydrant.latitude, hydrant.longitude, cabinets, max_distance=100)
-            hydrant.nearby_cabinets = json.dumps(nearby)
-        
         db.session.add(hydrant)
+        update_counters(hydrant, 1)
+        # חישוב ארונות קרובים וקישור דו-כיווני
+        sync_proximity(hydrant)
         db.session.commit()
         return jsonify(hydrant.to_dict()), 201
 
 @app.route('/api/hydrants/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def hydrant_detail(id):
-    hydrant = Hydrant.query.get_or_404(id)
+    hydrant = get_for_update_or_404(Hydrant, id)
 
     if request.method == 'GET':
         return jsonify(hydrant.to_dict())
@@ -664,6 +2377,7 @@ def hydrant_detail(id):
             return jsonify({'error': 'Insufficient permissions'}), 403
 
         data = request.json
+        previous = (hydrant.name, hydrant.latitude, hydrant.longitude)
         if 'serial_number' in data:
             hydrant.serial_number = data['serial_number']
         hydrant.name = data.get('name', hydrant.name)
@@ -682,12 +2396,9 @@ def hydrant_detail(id):
         if data.get('last_inspection_date'):
             hydrant.last_inspection_date = datetime.fromisoformat(data['last_inspection_date'])
         
-        # עדכון ארונות קרובים אם השתנו הקואורדינטות
-        if hydrant.latitude and hydrant.longitude:
-            cabinets = EquipmentCabinet.query.all()
-            nearby = find_nearby_items(hydrant.latitude, hydrant.longitude, cabinets, max_distance=100)
-            hydrant.nearby_cabinets = json.dumps(nearby)
-        
+        update_counters(hydrant)
+        # עדכון ארונות קרובים (בשני הכיוונים) אם השתנו הקואורדינטות
+        sync_proximity(hydrant, previous)
         db.session.commit()
         return jsonify(hydrant.to_dict())
 
@@ -696,6 +2407,8 @@ def hydrant_detail(id):
         if current_user.role not in ['manager', 'commander']:
             return jsonify({'error': 'Insufficient permissions'}), 403
 
+        update_counters(hydrant, -1)
+        remove_proximity(Hydrant, hydrant.id)
         db.session.delete(hydrant)
         db.session.commit()
         return '', 204
@@ -703,10 +2416,10 @@ def hydrant_detail(id):
 # Equipment Cabinets
 @app.route('/api/equipment-cabinets', methods=['GET', 'POST'])
 @login_required
+@conditional(EquipmentCabinet)
 def equipment_cabinets():
     if request.method == 'GET':
-        cabinets = EquipmentCabinet.query.all()
-        return jsonify([cabinet.to_dict() for cabinet in cabinets])
+        return list_response(EquipmentCabinet.query, EquipmentCabinet)
 
     elif request.method == 'POST':
         # Members and above can create equipment cabinets
@@ -729,20 +2442,17 @@ def equipment_cabinets():
         if data.get('installation_date'):
             cabinet.installation_date = datetime.fromisoformat(data['installation_date'])
         
-        # חישוב הידרנטים קרובים אם יש קואורדינטות
-        if cabinet.latitude and cabinet.longitude:
-            hydrants = Hydrant.query.all()
-            nearby = find_nearby_items(cabinet.latitude, cabinet.longitude, hydrants, max_distance=100)
-            cabinet.nearby_hydrants = json.dumps(nearby)
-        
         db.session.add(cabinet)
+        update_counters(cabinet, 1)
+        # חישוב הידרנטים קרובים וקישור דו-כיווני
+        sync_proximity(cabinet)
         db.session.commit()
         return jsonify(cabinet.to_dict()), 201
 
 @app.route('/api/equipment-cabinets/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def equipment_cabinet_detail(id):
-    cabinet = EquipmentCabinet.query.get_or_404(id)
+    cabinet = get_for_update_or_404(EquipmentCabinet, id)
 
     if request.method == 'GET':
         return jsonify(cabinet.to_dict())
@@ -753,6 +2463,7 @@ def equipment_cabinet_detail(id):
             return jsonify({'error': 'Insufficient permissions'}), 403
 
         data = request.json
+        previous = (cabinet.name, cabinet.latitude, cabinet.longitude)
         if 'cabinet_number' in data:
             cabinet.cabinet_number = data['cabinet_number']
         cabinet.name = data.get('name', cabinet.name)
@@ -769,12 +2480,9 @@ def equipment_cabinet_detail(id):
         if data.get('last_inspection_date'):
             cabinet.last_inspection_date = datetime.fromisoformat(data['last_inspection_date'])
         
-        # עדכון הידרנטים קרובים אם השתנו הקואורדינטות
-        if cabinet.latitude and cabinet.longitude:
-            hydrants = Hydrant.query.all()
-            nearby = find_nearby_items(cabinet.latitude, cabinet.longitude, hydrants, max_distance=100)
-            cabinet.nearby_hydrants = json.dumps(nearby)
-        
+        update_counters(cabinet)
+        # עדכון הידרנטים קרובים (בשני הכיוונים) אם השתנו הקואורדינטות
+        sync_proximity(cabinet, previous)
         db.session.commit()
         return jsonify(cabinet.to_dict())
 
@@ -783,6 +2491,8 @@ def equipment_cabinet_detail(id):
         if current_user.role not in ['manager', 'commander']:
             return jsonify({'error': 'Insufficient permissions'}), 403
 
+        update_counters(cabinet, -1)
+        remove_proximity(EquipmentCabinet, cabinet.id)
         db.session.delete(cabinet)
         db.session.commit()
         return '', 204
@@ -790,6 +2500,7 @@ def equipment_cabinet_detail(id):
 # Tasks
 @app.route('/api/tasks', methods=['GET', 'POST'])
 @login_required
+@conditional(Task)
 def tasks():
     if request.method == 'GET':
         quarter = request.args.get('quarter')
@@ -804,8 +2515,7 @@ def tasks():
         if status:
             query = query.filter_by(status=status)
         
-        tasks = query.all()
-        return jsonify([task.to_dict() for task in tasks])
+        return list_response(query, Task)
     
     elif request.method == 'POST':
         data = request.json
@@ -823,13 +2533,14 @@ def tasks():
         if data.get('due_date'):
             task.due_date = datetime.fromisoformat(data['due_date'])
         db.session.add(task)
+        update_counters(task, 1)
         db.session.commit()
         return jsonify(task.to_dict()), 201
 
 @app.route('/api/tasks/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def task_detail(id):
-    task = Task.query.get_or_404(id)
+    task = get_for_update_or_404(Task, id)
     
     if request.method == 'GET':
         return jsonify(task.to_dict())
@@ -851,10 +2562,12 @@ def task_detail(id):
             task.completed_date = datetime.fromisoformat(data['completed_date'])
         elif data.get('status') == 'completed' and not task.completed_date:
             task.completed_date = datetime.utcnow()
+        update_counters(task)
         db.session.commit()
         return jsonify(task.to_dict())
     
     elif request.method == 'DELETE':
+        update_counters(task, -1)
         db.session.delete(task)
         db.session.commit()
         return '', 204
@@ -862,6 +2575,7 @@ def task_detail(id):
 # Maintenance Records
 @app.route('/api/maintenance', methods=['GET', 'POST'])
 @login_required
+@conditional(MaintenanceRecord)
 def maintenance_records():
     if request.method == 'GET':
         item_type = request.args.get('item_type')
@@ -873,8 +2587,7 @@ def maintenance_records():
         if item_id:
             query = query.filter_by(item_id=int(item_id))
         
-        records = query.order_by(MaintenanceRecord.date.desc()).all()
-        return jsonify([record.to_dict() for record in records])
+        return list_response(query, MaintenanceRecord, newest_first_by=MaintenanceRecord.date)
     
     elif request.method == 'POST':
         data = request.json
@@ -897,7 +2610,7 @@ def maintenance_records():
 @app.route('/api/maintenance/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def maintenance_record_detail(id):
-    record = MaintenanceRecord.query.get_or_404(id)
+    record = get_for_update_or_404(MaintenanceRecord, id)
     
     if request.method == 'GET':
         return jsonify(record.to_dict())
@@ -925,6 +2638,7 @@ def maintenance_record_detail(id):
 # Volunteers
 @app.route('/api/volunteers', methods=['GET', 'POST'])
 @login_required
+@conditional(Volunteer)
 def volunteers():
     if request.method == 'GET':
         status = request.args.get('status')
@@ -935,9 +2649,10 @@ def volunteers():
             query = query.filter_by(status=status)
         if specialization:
             query = query.filter_by(specialization=specialization)
+        if request.args.get('skill'):
+            query = query.filter(Volunteer.id.in_(list_owner_ids(Volunteer, request.args['skill'])))
         
-        volunteers = query.all()
-        return jsonify([volunteer.to_dict() for volunteer in volunteers])
+        return list_response(query, Volunteer)
     
     elif request.method == 'POST':
         data = request.json
@@ -954,13 +2669,14 @@ def volunteers():
         if data.get('last_activity'):
             volunteer.last_activity = datetime.fromisoformat(data['last_activity'])
         db.session.add(volunteer)
+        update_counters(volunteer, 1)
         db.session.commit()
         return jsonify(volunteer.to_dict()), 201
 
 @app.route('/api/volunteers/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def volunteer_detail(id):
-    volunteer = Volunteer.query.get_or_404(id)
+    volunteer = get_for_update_or_404(Volunteer, id)
     
     if request.method == 'GET':
         return jsonify(volunteer.to_dict())
@@ -977,17 +2693,29 @@ def volunteer_detail(id):
         volunteer.notes = data.get('notes', volunteer.notes)
         if data.get('last_activity'):
             volunteer.last_activity = datetime.fromisoformat(data['last_activity'])
+        update_counters(volunteer)
         db.session.commit()
         return jsonify(volunteer.to_dict())
     
     elif request.method == 'DELETE':
+        update_counters(volunteer, -1)
         db.session.delete(volunteer)
         db.session.commit()
         return '', 204
 
+@app.route('/api/volunteers/<int:id>/activities', methods=['GET'])
+@login_required
+@conditional(Activity, Volunteer)
+def volunteer_activities(id):
+    """הפעילויות שהמתנדב רשום בהן כמשתתף (לפי שמו)"""
+    volunteer = Volunteer.query.get_or_404(id)
+    query = Activity.query.filter(Activity.id.in_(list_owner_ids(Activity, volunteer.name)))
+    return list_response(query, Activity, newest_first_by=Activity.date)
+
 # Activities
 @app.route('/api/activities', methods=['GET', 'POST'])
 @login_required
+@conditional(Activity)
 def activities():
     if request.method == 'GET':
         activity_type = request.args.get('activity_type')
@@ -998,9 +2726,10 @@ def activities():
             query = query.filter_by(activity_type=activity_type)
         if status:
             query = query.filter_by(status=status)
+        if request.args.get('participant'):
+            query = query.filter(Activity.id.in_(list_owner_ids(Activity, request.args['participant'])))
         
-        activities = query.order_by(Activity.date.desc()).all()
-        return jsonify([activity.to_dict() for activity in activities])
+        return list_response(query, Activity, newest_first_by=Activity.date)
     
     elif request.method == 'POST':
         data = request.json
@@ -1019,13 +2748,14 @@ def activities():
         if data.get('date'):
             activity.date = datetime.fromisoformat(data['date'])
         db.session.add(activity)
+        update_counters(activity, 1)
         db.session.commit()
         return jsonify(activity.to_dict()), 201
 
 @app.route('/api/activities/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def activity_detail(id):
-    activity = Activity.query.get_or_404(id)
+    activity = get_for_update_or_404(Activity, id)
     
     if request.method == 'GET':
         return jsonify(activity.to_dict())
@@ -1044,10 +2774,12 @@ def activity_detail(id):
         activity.created_by = data.get('created_by', activity.created_by)
         if data.get('date'):
             activity.date = datetime.fromisoformat(data['date'])
+        update_counters(activity)
         db.session.commit()
         return jsonify(activity.to_dict())
     
     elif request.method == 'DELETE':
+        update_counters(activity, -1)
         db.session.delete(activity)
         db.session.commit()
         return '', 204
@@ -1059,8 +2791,8 @@ def cabinet_items(cabinet_id):
     cabinet = EquipmentCabinet.query.get_or_404(cabinet_id)
     
     if request.method == 'GET':
-        items = EquipmentItem.query.filter_by(cabinet_id=cabinet_id).all()
-        return jsonify([item.to_dict() for item in items])
+        items, _ = row_dicts(EquipmentItem.query.filter_by(cabinet_id=cabinet_id), EquipmentItem)
+        return jsonify(items)
     
     elif request.method == 'POST':
         data = request.json
@@ -1079,13 +2811,14 @@ def cabinet_items(cabinet_id):
             item.last_check_date = datetime.fromisoformat(data['last_check_date'])
         
         db.session.add(item)
+        update_counters(item, 1)
         db.session.commit()
         return jsonify(item.to_dict()), 201
 
 @app.route('/api/equipment-items/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def equipment_item_detail(id):
-    item = EquipmentItem.query.get_or_404(id)
+    item = get_for_update_or_404(EquipmentItem, id)
     
     if request.method == 'GET':
         return jsonify(item.to_dict())
@@ -1104,14 +2837,291 @@ def equipment_item_detail(id):
         if 'last_check_date' in data:
             item.last_check_date = datetime.fromisoformat(data['last_check_date']) if data['last_check_date'] else None
         
+        update_counters(item)
         db.session.commit()
         return jsonify(item.to_dict())
     
     elif request.method == 'DELETE':
+        update_counters(item, -1)
         db.session.delete(item)
         db.session.commit()
         return '', 204
 
+# Bulk Import (CSV / JSON lines)
+IMPORT_BATCH_SIZE = 500
+
+IMPORT_SPECS = {
+    Hydrant: {
+        'key': 'serial_number',
+        'required': ('serial_number', 'name', 'location'),
+        'floats': ('latitude', 'longitude', 'diameter', 'water_pressure'),
+        'dates': ('last_inspection_date',),
+        'text': ('hydrant_type', 'status', 'notes'),
+        'defaults': {'hydrant_type': 'ground', 'status': 'operational', 'notes': ''}
+    },
+    EquipmentCabinet: {
+        'key': 'cabinet_number',
+        'required': ('cabinet_number', 'name', 'location'),
+        'floats': ('latitude', 'longitude'),
+        'dates': ('installation_date', 'last_inspection_date'),
+        'text': ('cabinet_type', 'equipment_list', 'status', 'notes'),
+        'defaults': {'cabinet_type': 'standard', 'equipment_list': '[]', 'status': 'ready', 'notes': ''}
+    }
+}
+
+def parse_import_row(model, raw):
+    """המרת שורת קלט לערכי עמודות - זורק ValueError עם הודעה לשורה לא תקינה"""
+    if not isinstance(raw, dict):
+        raise ValueError('Row must be an object')
+    spec = IMPORT_SPECS[model]
+    values = dict(spec['defaults'])
+    for field in spec['required']:
+        value = raw.get(field)
+        if value is None or str(value).strip() == '':
+            raise ValueError(f'Missing required field: {field}')
+        values[field] = str(value).strip()
+    for field in spec['text']:
+        if raw.get(field) not in (None, ''):
+            values[field] = str(raw[field])
+    for field in spec['floats']:
+        if raw.get(field) not in (None, ''):
+            try:
+                values[field] = float(raw[field])
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid number for {field}: {raw[field]}')
+    for field in spec['dates']:
+        if raw.get(field):
+            try:
+                values[field] = datetime.fromisoformat(raw[field])
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid date for {field}: {raw[field]}')
+    if model is Hydrant:
+        images = raw.get('images') or []
+        values['images'] = images if isinstance(images, str) else json.dumps(images)
+    for field, value in values.items():
+        length = getattr(model.__table__.c[field].type, 'length', None)
+        if length and isinstance(value, str) and len(value) > length:
+            raise ValueError(f'Value too long for {field} (max {length} characters)')
+    return values
+
+def iter_import_rows(import_format):
+    """קריאת גוף הבקשה כזרם - מחזיר (מספר שורה, שורה גולמית או שגיאה)"""
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig')
+    if import_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield row_number, row
+        return
+    for row_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, ValueError(f'Invalid JSON: {e}')
+
+def _insert_import_rows(model, rows):
+    """INSERT מרובה שורות יחד עם טבלאות הרשימות ואינדקס החיפוש - מחזיר את השורות שנוספו"""
+    stmt = db.insert(model).returning(
+        model.id, model.name, model.latitude, model.longitude, sort_by_parameter_order=True
+    )
+    inserted = db.session.execute(stmt, rows).all()
+    field = LIST_FIELDS[model]['field']
+    sync_list_rows(db.session.connection(), model, [(row.id, values.get(field)) for row, values in zip(inserted, rows)])
+    update_search_index(db.session.connection(), model, [(row.id, values) for row, values in zip(inserted, rows)])
+    return inserted
+
+def _insert_error(e):
+    """הודעת השגיאה של מסד הנתונים (שורה ראשונה), לדיווח על השורה שנכשלה"""
+    message = str(getattr(e, 'orig', None) or e).strip().splitlines()
+    return f'Insert failed: {message[0]}' if message else f'Insert failed: {e.__class__.__name__}'
+
+def insert_import_batch(model, batch, errors):
+    """הכנסת אצווה בפקודת INSERT מרובת שורות - מחזיר את השורות שנוספו
+
+    אם ה-INSERT המרוכז נכשל, השורות מוכנסות שוב אחת-אחת (כל אחת ב-savepoint),
+    כך שרק השורה הבעייתית מדווחת כשגיאה ושאר האצווה נשמרת.
+    """
+    key = IMPORT_SPECS[model]['key']
+    key_column = getattr(model, key)
+    existing = {
+        value for (value,) in db.session.query(key_column).filter(key_column.in_([v[key] for _, v in batch]))
+    }
+    pending = []
+    for row_number, values in batch:
+        if values[key] in existing:
+            errors.append({'row': row_number, 'error': f'{key} already exists: {values[key]}'})
+        else:
+            pending.append((row_number, values))
+    if not pending:
+        return []
+    try:
+        with db.session.begin_nested():
+            inserted = _insert_import_rows(model, [values for _, values in pending])
+        done = pending
+    except Exception:
+        inserted, done = [], []
+        for row_number, values in pending:
+            try:
+                with db.session.begin_nested():
+                    inserted += _insert_import_rows(model, [values])
+                done.append((row_number, values))
+            except Exception as e:
+                errors.append({'row': row_number, 'error': _insert_error(e)})
+    try:
+        if inserted:
+            update_counters_bulk(model, [values for _, values in done])
+            stage_index_changes(db.session(), model, inserted)
+            mark_changed(model, [row.id for row in inserted])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        errors.extend({'row': row_number, 'error': f'Batch insert failed: {e.__class__.__name__}'}
+                      for row_number, _ in done)
+        return []
+    return inserted
+
+def refresh_imported_proximity(model, inserted):
+    """קישור קרבה לכל הפריטים החדשים בסבב אחד ורענון מרוכז של השכנים שהושפעו"""
+    side = PROXIMITY_SIDES[model]
+    affected = relink_proximity(model, inserted)
+    refresh_nearby_json(model, [row.id for row in inserted])
+    refresh_nearby_json(side['other'], affected)
+    db.session.commit()
+
+def bulk_import(model):
+    if current_user.role not in ['manager', 'commander', 'member']:
+        return jsonify({'error': 'Insufficient permissions'}), 403
+    
+    import_format = request.args.get('format')
+    if not import_format:
+        if request.mimetype in ('text/csv', 'application/csv'):
+            import_format = 'csv'
+        elif request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+            import_format = 'jsonl'
+    if import_format not in ('csv', 'jsonl'):
+        return jsonify({'error': 'Unsupported format - send text/csv or application/x-ndjson'}), 400
+    
+    key = IMPORT_SPECS[model]['key']
+    errors = []
+    inserted = []
+    seen_keys = set()
+    batch = []
+    for row_number, raw in iter_import_rows(import_format):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            values = parse_import_row(model, raw)
+        except ValueError as e:
+            errors.append({'row': row_number, 'error': str(e)})
+            continue
+        if values[key] in seen_keys:
+            errors.append({'row': row_number, 'error': f'Duplicate {key} in file: {values[key]}'})
+            continue
+        seen_keys.add(values[key])
+        batch.append((row_number, values))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            inserted += insert_import_batch(model, batch, errors)
+            batch = []
+    if batch:
+        inserted += insert_import_batch(model, batch, errors)
+    
+    if inserted:
+        refresh_imported_proximity(model, inserted)
+    
+    errors.sort(key=lambda e: e['row'])
+    return jsonify({
+        'inserted': len(inserted),
+        'failed': len(errors),
+        'errors': errors
+    })
+
+@app.route('/api/hydrants/import', methods=['POST'])
+@login_required
+def import_hydrants():
+    """ייבוא מרוכז של הידרנטים מקובץ CSV או JSON lines"""
+    return bulk_import(Hydrant)
+
+@app.route('/api/equipment-cabinets/import', methods=['POST'])
+@login_required
+def import_equipment_cabinets():
+    """ייבוא מרוכז של ארונות ציוד מקובץ CSV או JSON lines"""
+    return bulk_import(EquipmentCabinet)
+
+# Streaming Export (CSV / JSON lines)
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+def export_batches(model):
+    """כל שורות הטבלה כ-tuples (שדות to_dict) באצוות, מסמן צד-שרת - הזיכרון לא תלוי בגודל הטבלה"""
+    columns = [model.__table__.columns[name] for name in row_fields(model)]
+    stmt = db.select(*columns).order_by(model.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    yield from db.session.execute(stmt).partitions()
+
+def export_lines(model, export_format):
+    """גוף הייצוא כזרם - חלק אחד לכל אצווה"""
+    names = row_fields(model)
+    if export_format == 'jsonl':
+        for batch in export_batches(model):
+            yield ''.join(app.json.dumps(dict(zip(names, row))) + '\n' for row in batch)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM - כדי ש-Excel יציג עברית נכון
+    writer.writerow(names)
+    for batch in export_batches(model):
+        writer.writerows([serialize_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_response(model, name):
+    export_format = request.args.get('format', 'jsonl')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unsupported format - use csv or jsonl'}), 400
+    response = app.response_class(
+        stream_with_context(export_lines(model, export_format)), mimetype=EXPORT_FORMATS[export_format]
+    )
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d')}.{export_format}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx מעביר את הזרם מיד, בלי לאגור
+    return response
+
+@app.route('/api/hydrants/export', methods=['GET'])
+@login_required
+def export_hydrants():
+    """ייצוא כל ההידרנטים כזרם CSV או JSON lines"""
+    return export_response(Hydrant, 'hydrants')
+
+@app.route('/api/equipment-items/export', methods=['GET'])
+@login_required
+def export_equipment_items():
+    """ייצוא כל פריטי הציוד כזרם CSV או JSON lines"""
+    return export_response(EquipmentItem, 'equipment-items')
+
+@app.route('/api/tasks/export', methods=['GET'])
+@login_required
+def export_tasks():
+    """ייצוא כל המשימות כזרם CSV או JSON lines"""
+    return export_response(Task, 'tasks')
+
+@app.route('/api/maintenance/export', methods=['GET'])
+@login_required
+def export_maintenance_records():
+    """ייצוא כל רשומות התחזוקה כזרם CSV או JSON lines"""
+    return export_response(MaintenanceRecord, 'maintenance')
+
+@app.route('/api/activities/export', methods=['GET'])
+@login_required
+def export_activities():
+    """ייצוא כל הפעילויות כזרם CSV או JSON lines"""
+    return export_response(Activity, 'activities')
+
 # Proximity APIs
 @app.route('/api/hydrants/<int:id>/nearby-cabinets', methods=['GET'])
 @login_required
@@ -1119,12 +3129,11 @@ def hydrant_nearby_cabinets(id):
     """מציאת ארונות קרובים להידרנט"""
     hydrant = Hydrant.query.get_or_404(id)
     
-    if not hydrant.latitude or not hydrant.longitude:
+    if hydrant.latitude is None or hydrant.longitude is None:
         return jsonify({'error': 'Hydrant has no GPS coordinates'}), 400
     
     max_distance = request.args.get('max_distance', 100, type=int)
-    cabinets = EquipmentCabinet.query.all()
-    nearby = find_nearby_items(hydrant.latitude, hydrant.longitude, cabinets, max_distance)
+    nearby = cabinet_index.nearby(hydrant.latitude, hydrant.longitude, max_distance)
     
     return jsonify(nearby)
 
@@ -1134,152 +3143,408 @@ def cabinet_nearby_hydrants(id):
     """מציאת הידרנטים קרובים לארון"""
     cabinet = EquipmentCabinet.query.get_or_404(id)
     
-    if not cabinet.latitude or not cabinet.longitude:
+    if cabinet.latitude is None or cabinet.longitude is None:
         return jsonify({'error': 'Cabinet has no GPS coordinates'}), 400
     
     max_distance = request.args.get('max_distance', 100, type=int)
-    hydrants = Hydrant.query.all()
-    nearby = find_nearby_items(cabinet.latitude, cabinet.longitude, hydrants, max_distance)
+    nearby = hydrant_index.nearby(cabinet.latitude, cabinet.longitude, max_distance)
     
     return jsonify(nearby)
 
 # Alerts and Notifications
 @app.route('/api/dashboard/alerts', methods=['GET'])
 @login_required
+@conditional(*ALERT_MODELS, extra=alerts_expiry)
 def dashboard_alerts():
     """קבלת כל ההתראות הפעילות במערכת"""
-    alerts = check_inspection_alerts()
+    alerts = get_inspection_alerts()
     return jsonify(alerts)
 
 # GeoJSON for Map Visualization
-@app.route('/api/hydrants/map', methods=['GET'])
-@login_required
-def hydrants_geojson():
-    """החזרת הידרנטים בפורמט GeoJSON למפות"""
-    hydrants = Hydrant.query.filter(Hydrant.latitude.isnot(None), Hydrant.longitude.isnot(None)).all()
-    
-    features = []
-    for hydrant in hydrants:
-        features.append({
-            'type': 'Feature',
-            'geometry': {
-                'type': 'Point',
-                'coordinates': [hydrant.longitude, hydrant.latitude]
-            },
-            'properties': {
-                'id': hydrant.id,
-                'name': hydrant.name,
-                'serial_number': hydrant.serial_number,
-                'status': hydrant.status,
-                'hydrant_type': hydrant.hydrant_type,
-                'water_pressure': hydrant.water_pressure,
-                'location': hydrant.location
-            }
-        })
+MAP_CLUSTER_MAX_ZOOM = 15  # מזום זה ומטה מוחזרים אשכולות במקום פריטים בודדים
+MAP_CLUSTER_CELLS_PER_TILE = 4  # חלוקת כל אריח (256px) לתאי אשכול של 64px
+
+MAP_LAYERS = {
+    'hydrants': (Hydrant, ('id', 'name', 'serial_number', 'status', 'hydrant_type', 'water_pressure', 'location')),
+    'cabinets': (EquipmentCabinet, ('id', 'name', 'cabinet_number', 'status', 'cabinet_type', 'location'))
+}
+
+def tile_bbox(z, x, y):
+    """תיבה תוחמת (west, south, east, north) של אריח XYZ"""
+    n = 2 ** z
+    west = x / n * 360 - 180
+    east = (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+def _grid_cell(column, offset, size):
+    """מספר תא רשת עבור עמודת קואורדינטה (חישוב בצד מסד הנתונים)"""
+    value = (column + offset) / size
+    if db.engine.dialect.name == 'sqlite':
+        # הערכים חיוביים אחרי ההזזה, כך ש-CAST חותך כמו floor
+        return db.cast(value, db.Integer)
+    return db.func.floor(value)
+
+def map_query(model, bbox):
+    query = db.session.query(model).filter(model.latitude.isnot(None), model.longitude.isnot(None))
+    if bbox:
+        west, south, east, north = bbox
+        query = query.filter(model.latitude.between(south, north))
+        if west <= east:
+            query = query.filter(model.longitude.between(west, east))
+        else:  # תיבה שחוצה את קו התאריך
+            query = query.filter(db.or_(model.longitude >= west, model.longitude <= east))
+    return query
+
+def map_features(layer, bbox=None):
+    """פריטים בודדים כ-GeoJSON - רק העמודות שמוצגות במפה"""
+    model, fields = MAP_LAYERS[layer]
+    rows = map_query(model, bbox).with_entities(
+        model.longitude, model.latitude, *[getattr(model, field) for field in fields]
+    ).all()
+    return [{
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [row[0], row[1]]},
+        'properties': dict(zip(fields, row[2:]))
+    } for row in rows]
+
+def map_clusters(layer, bbox, zoom):
+    """אשכולות לפי תאי רשת בגודל התלוי בזום - ספירה ופילוח סטטוסים לכל תא"""
+    model, _ = MAP_LAYERS[layer]
+    cell_size = 360 / (2 ** zoom) / MAP_CLUSTER_CELLS_PER_TILE
+    cell_x = _grid_cell(model.longitude, 180, cell_size).label('cell_x')
+    cell_y = _grid_cell(model.latitude, 90, cell_size).label('cell_y')
+    rows = map_query(model, bbox).with_entities(
+        cell_x, cell_y, model.status,
+        db.func.count(), db.func.sum(model.latitude), db.func.sum(model.longitude)
+    ).group_by(cell_x, cell_y, model.status).all()
     
+    cells = {}
+    for x, y, status, count, lat_sum, lon_sum in rows:
+        cell = cells.setdefault((x, y), {'count': 0, 'lat_sum': 0.0, 'lon_sum': 0.0, 'statuses': {}})
+        cell['count'] += count
+        cell['lat_sum'] += lat_sum
+        cell['lon_sum'] += lon_sum
+        cell['statuses'][status] = count
+    return [{
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': [cell['lon_sum'] / cell['count'], cell['lat_sum'] / cell['count']]
+        },
+        'properties': {
+            'cluster': True,
+            'count': cell['count'],
+            'statuses': cell['statuses']
+        }
+    } for cell in cells.values()]
+
+def map_response(layer, bbox=None, zoom=None):
+    if zoom is not None and zoom <= MAP_CLUSTER_MAX_ZOOM:
+        features = map_clusters(layer, bbox, zoom)
+    else:
+        features = map_features(layer, bbox)
     return jsonify({
         'type': 'FeatureCollection',
         'features': features
     })
 
+def map_request_response(layer):
+    """פרמטרים אופציונליים: bbox=west,south,east,north ו-zoom"""
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = [float(value) for value in request.args['bbox'].split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            return jsonify({'error': 'bbox must be west,south,east,north'}), 400
+    zoom = request.args.get('zoom', type=int)
+    if zoom is not None and not 0 <= zoom <= 22:
+        return jsonify({'error': 'zoom must be between 0 and 22'}), 400
+    return map_response(layer, bbox, zoom)
+
+@app.route('/api/hydrants/map', methods=['GET'])
+@login_required
+@conditional(Hydrant)
+def hydrants_geojson():
+    """החזרת הידרנטים בפורמט GeoJSON למפות"""
+    return map_request_response('hydrants')
+
 @app.route('/api/cabinets/map', methods=['GET'])
 @login_required
+@conditional(EquipmentCabinet)
 def cabinets_geojson():
     """החזרת ארונות בפורמט GeoJSON למפות"""
-    cabinets = EquipmentCabinet.query.filter(
-        EquipmentCabinet.latitude.isnot(None), 
-        EquipmentCabinet.longitude.isnot(None)
-    ).all()
-    
-    features = []
-    for cabinet in cabinets:
-        features.append({
-            'type': 'Feature',
-            'geometry': {
-                'type': 'Point',
-                'coordinates': [cabinet.longitude, cabinet.latitude]
-            },
-            'properties': {
-                'id': cabinet.id,
-                'name': cabinet.name,
-                'cabinet_number': cabinet.cabinet_number,
-                'status': cabinet.status,
-                'cabinet_type': cabinet.cabinet_type,
-                'location': cabinet.location
-            }
-        })
-    
-    return jsonify({
-        'type': 'FeatureCollection',
-        'features': features
-    })
+    return map_request_response('cabinets')
+
+@app.route('/api/map/tiles/<layer>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@login_required
+@conditional(Hydrant, EquipmentCabinet)
+def map_tile(layer, z, x, y):
+    """אריח מפה (XYZ) כ-GeoJSON - אשכולות בזום נמוך, פריטים בזום גבוה"""
+    if layer not in MAP_LAYERS:
+        return jsonify({'error': 'Unknown layer'}), 404
+    if not 0 <= z <= 22 or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        return jsonify({'error': 'Invalid tile coordinates'}), 400
+    return map_response(layer, tile_bbox(z, x, y), z)
+
+# Delta sync
+SYNC_PAGE_SIZE = 500
+
+def sync_page(since, limit):
+    """השינויים שאחרי since לפי סדר seq: רשומות מלאות לשינויים ומזהים בלבד למחיקות"""
+    entries = SyncChange.query.filter(SyncChange.seq > since).order_by(SyncChange.seq).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    changed = {entity: [] for entity in SYNC_MODELS}
+    deleted = {entity: [] for entity in SYNC_MODELS}
+    for entry in entries:
+        (deleted if entry.deleted else changed)[entry.entity].append(entry.entity_id)
+    for entity, ids in changed.items():
+        model = SYNC_MODELS[entity]
+        rows = []
+        for chunk in _chunks(ids):
+            rows.extend(row_dicts(model.query.filter(model.id.in_(chunk)).order_by(model.id), model)[0])
+        changed[entity] = rows
+    return {
+        'token': str(entries[-1].seq if entries else since),
+        'has_more': has_more,
+        'changes': changed,
+        'deleted': deleted,
+    }
+
+def search_rows(tokens, entities, limit):
+    """(entity, id, label, score) של הרשומות שמכילות את כל המילים (כתחילית, עם או בלי אותיות
+    השימוש בתחילתן - 'הברז' מוצא את 'ברז'), מהרלוונטית ביותר"""
+    params = {'entities': entities, 'limit': limit}
+    groups = [search_variants(token) for token in tokens]
+    if db.session.get_bind().dialect.name == 'sqlite':
+        params['query'] = ' AND '.join(
+            '(' + ' OR '.join(f'"{variant}"*' for variant in group) + ')' for group in groups
+        )
+        sql = (
+            'SELECT entity, entity_id, label, -bm25(search_index, 0, 0, 0, 10.0, 1.0) AS score '
+            'FROM search_index WHERE search_index MATCH :query AND entity IN :entities '
+            'ORDER BY score DESC LIMIT :limit'
+        )
+    else:
+        params['query'] = ' & '.join(
+            '(' + ' | '.join(f'{variant}:*' for variant in group) + ')' for group in groups
+        )
+        sql = (
+            "SELECT entity, entity_id, label, ts_rank(document, to_tsquery('simple', :query)) AS score "
+            "FROM search_index WHERE document @@ to_tsquery('simple', :query) AND entity IN :entities "
+            "ORDER BY score DESC LIMIT :limit"
+        )
+    stmt = db.text(sql).bindparams(db.bindparam('entities', expanding=True)).columns(
+        entity=db.String, entity_id=db.Integer, label=db.String, score=db.Float
+    )
+    return db.session.execute(stmt, params).all()
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+@conditional(*(spec['model'] for spec in SEARCH_SPECS.values()))
+def search():
+    """חיפוש טקסט חופשי בהידרנטים, ארונות, משימות ורשומות תחזוקה - מדורג לפי רלוונטיות
+
+    q - מילות החיפוש (כל מילה כתחילית, כל המילים חייבות להופיע); types - סינון ישויות; limit - מספר תוצאות
+    """
+    tokens = search_tokens(request.args.get('q', ''))
+    if not tokens:
+        return jsonify({'error': 'Search query (q) is required'}), 400
+    entities = request.args.get('types', ','.join(SEARCH_SPECS)).split(',')
+    unknown = [entity for entity in entities if entity not in SEARCH_SPECS]
+    if unknown:
+        return jsonify({'error': f'Unknown types: {", ".join(unknown)}'}), 400
+    limit = request.args.get('limit', 20, type=int)
+    if not 0 < limit <= SEARCH_MAX_RESULTS:
+        return jsonify({'error': f'limit must be between 1 and {SEARCH_MAX_RESULTS}'}), 400
+    if db.session.get_bind().dialect.name not in SEARCH_INDEX_DDL:
+        return jsonify({'error': 'Search is not supported on this database'}), 501
+
+    return jsonify([
+        {'type': row.entity, 'id': row.entity_id, 'title': row.label, 'score': round(row.score, 4)}
+        for row in search_rows(tokens, entities, limit)
+    ])
+
+@app.route('/api/sync', methods=['GET'])
+@login_required
+@conditional(SyncChange)
+def sync():
+    """סנכרון מצטבר ללקוחות offline - רק מה שהשתנה מאז הטוקן הקודם
+
+    בלי since (או since=0) מוחזר כל המצב בעמודים. טוקן שאינו מוכר לשרת (למשל אחרי
+    איפוס מסד הנתונים) מחזיר reset=true - הלקוח מוחק את העותק המקומי ומתחיל מההתחלה.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'error': 'Invalid sync token'}), 400
+    limit = request.args.get('limit', SYNC_PAGE_SIZE, type=int)
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    latest = db.session.query(db.func.max(SyncChange.seq)).scalar() or 0
+    reset = not 0 <= since <= latest
+    page = sync_page(0 if reset else since, limit)
+    page['reset'] = reset
+    return jsonify(page)
+
+def backfill_sync_log():
+    """רישום כל הרשומות הקיימות ביומן הסנכרון (לפני שהיומן התחיל להתעדכן)"""
+    for entity, model in SYNC_MODELS.items():
+        logged = {
+            entity_id for (entity_id,) in db.session.query(SyncChange.entity_id).filter(SyncChange.entity == entity)
+        }
+        ids = [item_id for (item_id,) in db.session.query(model.id).order_by(model.id) if item_id not in logged]
+        mark_changed(model, ids)
+
+def backfill_list_fields():
+    """בניית הטבלאות המנורמלות מכל שדות הרשימה הקיימים"""
+    connection = db.session.connection()
+    for model, spec in LIST_FIELDS.items():
+        field = getattr(model, spec['field'])
+        items = db.session.query(model.id, field).order_by(model.id).all()
+        for chunk in _chunks(items):
+            sync_list_rows(connection, model, chunk)
+
+def backfill_search_index():
+    """הכנסת כל הרשומות הקיימות לאינדקס החיפוש"""
+    connection = db.session.connection()
+    for spec in SEARCH_SPECS.values():
+        model = spec['model']
+        fields = sorted({*spec['title'], *spec['body'], spec['label']})
+        rows = db.session.query(model.id, *(getattr(model, field) for field in fields)).order_by(model.id).all()
+        for chunk in _chunks(rows):
+            update_search_index(connection, model, [(row[0], dict(zip(fields, row[1:]))) for row in chunk])
 
 # Dashboard Statistics
+def aggregate_counts(model, **conditions):
+    """ספירת כל השורות בטבלה וספירה מותנית לכל תנאי - בשאילתה אחת"""
+    columns = [db.func.count()]
+    columns += [db.func.count(db.case((condition, 1))) for condition in conditions.values()]
+    row = db.session.query(*columns).select_from(model).one()
+    counts = {'total': row[0]}
+    counts.update(zip(conditions.keys(), row[1:]))
+    return counts
+
+DASHBOARD_MODELS = (
+    Team, Hydrant, EquipmentCabinet, EquipmentItem, Task, MaintenanceRecord, Volunteer, Activity
+)
+
+def dashboard_period():
+    """רכיב ETag לסטטיסטיקות - תפוגת ההתראות (כולל משימות באיחור) והחודש הנוכחי"""
+    return alerts_expiry(), datetime.now().strftime('%Y-%m')
+
 @app.route('/api/dashboard/stats', methods=['GET'])
+@conditional(*DASHBOARD_MODELS, DashboardCounter, extra=dashboard_period)
 def dashboard_stats():
     
-    alerts = check_inspection_alerts()
+    alerts = get_inspection_alerts()
+    now = datetime.utcnow()
+    month_start = datetime.now().replace(day=1)
+    
+    if app.config['DASHBOARD_COUNTERS']:
+        counters = read_counters()
+        
+        def counted(prefix, field, *values):
+            counts = {'total': counters.get(f'{prefix}.total', 0)}
+            for value in values:
+                counts[value] = counters.get(f'{prefix}.{field}.{value}', 0)
+            return counts
+        
+        teams = counted('teams', 'status', 'available', 'on_duty')
+        hydrants = counted('hydrants', 'status', 'operational', 'needs_maintenance', 'broken')
+        cabinets = counted('equipment_cabinets', 'status', 'ready', 'needs_check', 'incomplete')
+        items = counted('equipment_items', 'status', 'good', 'needs_replacement', 'missing')
+        tasks = counted('tasks', 'status', 'new', 'in_progress', 'completed')
+        tasks['critical'] = counters.get('tasks.priority.critical', 0)
+        volunteers = counted('volunteers', 'status', 'available', 'busy', 'unavailable')
+        activities = counted('activities', 'status', 'planned', 'ongoing', 'completed')
+        # ספירות תלויות-זמן אינן ניתנות לתחזוקה כמונים
+        tasks['overdue'] = Task.query.filter(
+            Task.status.in_(['new', 'in_progress', 'waiting']),
+            Task.due_date != None,
+            Task.due_date < now
+        ).count()
+        activities['this_month'] = Activity.query.filter(Activity.date >= month_start).count()
+    else:
+        teams = aggregate_counts(
+            Team,
+            available=Team.status == 'available',
+            on_duty=Team.status == 'on_duty'
+        )
+        hydrants = aggregate_counts(
+            Hydrant,
+            operational=Hydrant.status == 'operational',
+            needs_maintenance=Hydrant.status == 'needs_maintenance',
+            broken=Hydrant.status == 'broken'
+        )
+        cabinets = aggregate_counts(
+            EquipmentCabinet,
+            ready=EquipmentCabinet.status == 'ready',
+            needs_check=EquipmentCabinet.status == 'needs_check',
+            incomplete=EquipmentCabinet.status == 'incomplete'
+        )
+        items = aggregate_counts(
+            EquipmentItem,
+            good=EquipmentItem.status == 'good',
+            needs_replacement=EquipmentItem.status == 'needs_replacement',
+            missing=EquipmentItem.status == 'missing'
+        )
+        tasks = aggregate_counts(
+            Task,
+            new=Task.status == 'new',
+            in_progress=Task.status == 'in_progress',
+            completed=Task.status == 'completed',
+            critical=Task.priority == 'critical',
+            overdue=db.and_(
+                Task.status.in_(['new', 'in_progress', 'waiting']),
+                Task.due_date != None,
+                Task.due_date < now
+            )
+        )
+        volunteers = aggregate_counts(
+            Volunteer,
+            available=Volunteer.status == 'available',
+            busy=Volunteer.status == 'busy',
+            unavailable=Volunteer.status == 'unavailable'
+        )
+        activities = aggregate_counts(
+            Activity,
+            planned=Activity.status == 'planned',
+            ongoing=Activity.status == 'ongoing',
+            completed=Activity.status == 'completed',
+            this_month=Activity.date >= month_start
+        )
     
+    maintenance = aggregate_counts(
+        MaintenanceRecord,
+        this_month=MaintenanceRecord.date >= month_start
+    )
     stats = {
-        'teams': {
-            'total': Team.query.count(),
-            'available': Team.query.filter_by(status='available').count(),
-            'on_duty': Team.query.filter_by(status='on_duty').count()
-        },
+        'teams': teams,
         'hydrants': {
-            'total': Hydrant.query.count(),
-            'operational': Hydrant.query.filter_by(status='operational').count(),
-            'needs_maintenance': Hydrant.query.filter_by(status='needs_maintenance').count(),
-            'broken': Hydrant.query.filter_by(status='broken').count(),
-            'out_of_service': Hydrant.query.filter_by(status='broken').count()  # Alias for compatibility
-        },
-        'equipment_cabinets': {
-            'total': EquipmentCabinet.query.count(),
-            'ready': EquipmentCabinet.query.filter_by(status='ready').count(),
-            'needs_check': EquipmentCabinet.query.filter_by(status='needs_check').count(),
-            'incomplete': EquipmentCabinet.query.filter_by(status='incomplete').count()
-        },
-        'equipment_items': {
-            'total': EquipmentItem.query.count(),
-            'good': EquipmentItem.query.filter_by(status='good').count(),
-            'needs_replacement': EquipmentItem.query.filter_by(status='needs_replacement').count(),
-            'missing': EquipmentItem.query.filter_by(status='missing').count()
+            **hydrants,
+            'out_of_service': hydrants['broken']  # Alias for compatibility
         },
+        'equipment_cabinets': cabinets,
+        'equipment_items': items,
         'tasks': {
-            'total': Task.query.count(),
-            'new': Task.query.filter_by(status='new').count(),
-            'pending': Task.query.filter_by(status='new').count(),  # Alias for compatibility
-            'in_progress': Task.query.filter_by(status='in_progress').count(),
-            'completed': Task.query.filter_by(status='completed').count(),
-            'critical': Task.query.filter_by(priority='critical').count(),
-            'urgent': Task.query.filter_by(priority='critical').count(),  # Alias for compatibility
-            'overdue': Task.query.filter(
-                Task.status.in_(['new', 'in_progress', 'waiting']),
-                Task.due_date != None,
-                Task.due_date < datetime.utcnow()
-            ).count()
-        },
-        'maintenance': {
-            'total': MaintenanceRecord.query.count(),
-            'this_month': MaintenanceRecord.query.filter(
-                MaintenanceRecord.date >= datetime.now().replace(day=1)
-            ).count()
-        },
-        'volunteers': {
-            'total': Volunteer.query.count(),
-            'available': Volunteer.query.filter_by(status='available').count(),
-            'busy': Volunteer.query.filter_by(status='busy').count(),
-            'unavailable': Volunteer.query.filter_by(status='unavailable').count()
-        },
-        'activities': {
-            'total': Activity.query.count(),
-            'planned': Activity.query.filter_by(status='planned').count(),
-            'ongoing': Activity.query.filter_by(status='ongoing').count(),
-            'completed': Activity.query.filter_by(status='completed').count(),
-            'this_month': Activity.query.filter(
-                Activity.date >= datetime.now().replace(day=1)
-            ).count()
+            'total': tasks['total'],
+            'new': tasks['new'],
+            'pending': tasks['new'],  # Alias for compatibility
+            'in_progress': tasks['in_progress'],
+            'completed': tasks['completed'],
+            'critical': tasks['critical'],
+            'urgent': tasks['critical'],  # Alias for compatibility
+            'overdue': tasks['overdue']
         },
+        'maintenance': maintenance,
+        'volunteers': volunteers,
+        'activities': activities,
         'alerts': {
             'total': len(alerts),
             'critical': len([a for a in alerts if a['severity'] == 'critical']),
@@ -1289,27 +3554,172 @@ def dashboard_stats():
     }
     return jsonify(stats)
 
+# Schema migrations
+def create_missing_indexes():
+    """יצירת אינדקסים שהוגדרו במודלים וחסרים בטבלאות קיימות"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.session.connection(), checkfirst=True)
+
+def create_viewport_indexes():
+    """יצירת אינדקסי הקואורדינטות של ברזים וארונות, לשאילתות חלון המפה"""
+    for model in (Hydrant, EquipmentCabinet):
+        for index in model.__table__.indexes:
+            if [column.name for column in index.columns] == ['latitude', 'longitude']:
+                index.create(bind=db.session.connection(), checkfirst=True)
+
+# רשימת מיגרציות לפי סדר - יש להוסיף בסוף בלבד
+MIGRATIONS = [
+    (1, 'Add indexes on hot filter columns', create_missing_indexes),
+    (2, 'Build proximity links between hydrants and cabinets', backfill_proximity_links),
+    (3, 'Add coordinate indexes for map viewport queries', create_viewport_indexes),
+    (4, 'Record existing rows in the sync change log', backfill_sync_log),
+    (5, 'Normalize list fields into association tables', backfill_list_fields),
+    (6, 'Build the full-text search index', backfill_search_index),
+]
+
+def run_migrations():
+    """יצירת טבלאות חסרות והחלת מיגרציות שטרם הוחלו"""
+    db.create_all()
+    applied = {version for (version,) in db.session.query(SchemaMigration.version).all()}
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate()
+        db.session.add(SchemaMigration(version=version, name=name))
+        db.session.commit()
+        print(f'Applied migration {version}: {name}')
+
+def hot_queries():
+    """השאילתות החמות של המערכת, לבדיקת תוכנית ביצוע"""
+    now = datetime.utcnow()
+    return {
+        'alerts: hydrants needing inspection': db.select(Hydrant.id, Hydrant.name).where(
+            (Hydrant.last_inspection_date == None) | (Hydrant.last_inspection_date < now)
+        ),
+        'alerts: expiring extinguishers': db.select(EquipmentItem.id).where(
+            EquipmentItem.item_type == 'extinguisher',
+            EquipmentItem.expiry_date != None,
+            EquipmentItem.expiry_date <= now
+        ),
+        'alerts / stats: overdue tasks': db.select(Task.id).where(
+            Task.status.in_(['new', 'in_progress', 'waiting']),
+            Task.due_date != None,
+            Task.due_date < now
+        ),
+        'tasks: by quarter and year': db.select(Task.id).where(Task.quarter == 'Q1', Task.year == now.year),
+        'tasks: by status': db.select(Task.id).where(Task.status == 'new'),
+        'maintenance: by item': db.select(MaintenanceRecord.id).where(
+            MaintenanceRecord.item_type == 'hydrant', MaintenanceRecord.item_id == 1
+        ).order_by(MaintenanceRecord.date.desc()),
+        'stats: maintenance this month': db.select(MaintenanceRecord.id).where(MaintenanceRecord.date >= now),
+        'stats: activities this month': db.select(Activity.id).where(Activity.date >= now),
+        'cabinet items': db.select(EquipmentItem.id).where(EquipmentItem.cabinet_id == 1),
+        'volunteers: by status': db.select(Volunteer.id).where(Volunteer.status == 'available'),
+        'map: hydrants in viewport': db.select(Hydrant.id).where(
+            Hydrant.latitude.between(31.4, 31.5), Hydrant.longitude.between(34.6, 34.7)
+        ),
+    }
+
+def check_full_scans():
+    """הרצת EXPLAIN על השאילתות החמות ודיווח אילו מהן סורקות טבלה מלאה"""
+    dialect = db.engine.dialect
+    report = []
+    with db.engine.connect() as conn:
+        for name, stmt in hot_queries().items():
+            compiled = stmt.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+            params = compiled.params
+            if compiled.positional:
+                params = tuple(compiled.params[key] for key in compiled.positiontup)
+            if dialect.name == 'sqlite':
+                plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)]
+                full_scan = any(line.startswith('SCAN ') and 'USING' not in line for line in plan)
+            else:
+                plan = [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + str(compiled), params)]
+                full_scan = any('Seq Scan' in line for line in plan)
+            report.append({'query': name, 'full_scan': full_scan, 'plan': plan})
+    return report
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations"""
+    run_migrations()
+
+@app.cli.command('check-indexes')
+def check_indexes_command():
+    """Report hot queries that still do full table scans"""
+    for entry in check_full_scans():
+        status = 'FULL SCAN' if entry['full_scan'] else 'ok'
+        print(f"[{status:>9}] {entry['query']}")
+        for line in entry['plan']:
+            print(f'            {line}')
+
 # Initialize database
 @app.route('/api/init-db', methods=['POST'])
 def init_db():
-    db.create_all()
+    run_migrations()
     return jsonify({'message': 'Database initialized successfully'}), 201
 
 # Initialize SocketIO (after Flask app is created)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# עם תור הודעות כל תהליך מפרסם דרכו, וכל אירוע מגיע ללקוחות המחוברים לכל התהליכים
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+    message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+    channel=app.config['SOCKETIO_CHANNEL'],
+    transports=app.config['SOCKETIO_TRANSPORTS'],
+    cookie=app.config['SOCKETIO_STICKY_COOKIE'],
+)
+
+PUSH_ENTITIES = {room: model for model, room in PUSH_ROOMS.items()}
 
 @socketio.on('connect')
 def handle_connect():
+    if not current_user.is_authenticated:
+        return False
     print('Client connected')
+    # חדר הצוות של המשתמש - עדכוני סטטוס הצוות בלי הרשמה מפורשת
+    if current_user.team_id:
+        join_room(team_room(current_user.team_id))
     emit('response', {'data': 'Connected to server'})
 
+def requested_rooms(data):
+    """חדרים מבוקשים: סוגי ישויות (tasks, hydrants...) או team:<id>"""
+    rooms = (data or {}).get('rooms') or []
+    return [
+        room for room in rooms
+        if isinstance(room, str) and (
+            room in PUSH_ENTITIES
+            or (room.startswith('team:') and room[len('team:'):].isdigit())
+        )
+    ]
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """הרשמה לאירועי שינוי - {"rooms": ["tasks", "team:3"]}"""
+    rooms = requested_rooms(data)
+    for room in rooms:
+        join_room(room)
+    return {'rooms': rooms}
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    rooms = requested_rooms(data)
+    for room in rooms:
+        leave_room(room)
+    return {'rooms': rooms}
+
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        run_migrations()
+
+    if app.config['DASHBOARD_COUNTERS']:
+        socketio.start_background_task(counters_reconcile_loop)
 
     # Get configuration from environment
     debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() in ('true', '1', 'yes')
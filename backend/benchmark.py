@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Fire Department Tracker backend.
+Runs against a temporary SQLite database so production data is never touched.
+
+Usage:
+    python benchmark.py alerts
+    python benchmark.py distance
+    python benchmark.py serialize
+    python benchmark.py serve
+"""
+
+import http.client
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Point the app at a throwaway database before importing it
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+import app as app_module
+from app import (
+    app, db, EquipmentCabinet, EquipmentItem, Hydrant, MaintenanceRecord, Task, User,
+    calculate_distance, check_inspection_alerts, haversine_many, haversine_matrix, row_dicts, run_migrations
+)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class QueryCounter:
+    """Counts SQL statements executed on the engine while active"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+
+
+def reset_database():
+    # End the previous round's read transaction so its stale snapshot cannot block the inserts
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+
+def benchmark_alerts(sizes=(10, 100, 1000)):
+    """Query count and time of check_inspection_alerts as expiring items grow"""
+    print(f"{'expiring items':>15} {'alerts':>8} {'queries':>8} {'time (ms)':>10}")
+    for size in sizes:
+        reset_database()
+        expiry = datetime.utcnow() + timedelta(days=10)
+        cabinets = [
+            EquipmentCabinet(cabinet_number=f'C{i}', name=f'Cabinet {i}', location='bench')
+            for i in range(max(size // 10, 1))
+        ]
+        db.session.add_all(cabinets)
+        db.session.flush()
+        db.session.add_all([
+            EquipmentItem(cabinet_id=cabinets[i % len(cabinets)].id, item_type='extinguisher',
+                          item_name=f'Extinguisher {i}', expiry_date=expiry)
+            for i in range(size)
+        ])
+        db.session.add_all([
+            Hydrant(serial_number=f'H{i}', name=f'Hydrant {i}', location='bench')
+            for i in range(size)
+        ])
+        db.session.add_all([
+            Task(title=f'Task {i}', status='new', due_date=datetime.utcnow() - timedelta(days=1))
+            for i in range(size)
+        ])
+        db.session.commit()
+        db.session.expunge_all()
+
+        start = time.perf_counter()
+        with QueryCounter() as counter:
+            alerts = check_inspection_alerts()
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{size:>15} {len(alerts):>8} {counter.count:>8} {elapsed:>10.1f}")
+
+
+def _timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_distance(sizes=(1000, 10000, 100000), sources=100):
+    """Scalar calculate_distance loop vs the batch Haversine functions"""
+    print(f"numpy available: {app_module.np is not None}")
+    print(f"{'points':>8} {'1->N loop (ms)':>15} {'1->N batch (ms)':>16} "
+          f"{f'{sources}->N loop (ms)':>17} {f'{sources}->N batch (ms)':>18}")
+    rng = random.Random(42)
+    source_lats = [31.4 + rng.random() * 0.1 for _ in range(sources)]
+    source_lons = [34.6 + rng.random() * 0.1 for _ in range(sources)]
+    for size in sizes:
+        lats = [31.4 + rng.random() * 0.1 for _ in range(size)]
+        lons = [34.6 + rng.random() * 0.1 for _ in range(size)]
+        batch_lats = app_module.np.asarray(lats) if app_module.np is not None else lats
+        batch_lons = app_module.np.asarray(lons) if app_module.np is not None else lons
+
+        one_loop = _timed(lambda: [calculate_distance(31.45, 34.65, lat, lon) for lat, lon in zip(lats, lons)])
+        one_batch = _timed(lambda: haversine_many(31.45, 34.65, batch_lats, batch_lons))
+        many_loop = _timed(lambda: [
+            [calculate_distance(s_lat, s_lon, lat, lon) for lat, lon in zip(lats, lons)]
+            for s_lat, s_lon in zip(source_lats, source_lons)
+        ], repeat=1)
+        many_batch = _timed(lambda: haversine_matrix(source_lats, source_lons, batch_lats, batch_lons), repeat=1)
+        print(f"{size:>8} {one_loop:>15.2f} {one_batch:>16.2f} {many_loop:>17.1f} {many_batch:>18.1f}")
+
+
+def benchmark_serialize(sizes=(1000, 10000)):
+    """List serialization: ORM objects + to_dict + stdlib json vs column tuples + the app's JSON provider"""
+    print(f"orjson available: {app_module.orjson is not None}")
+    print(f"{'model':>18} {'rows':>6} {'to_dict+json (ms)':>18} {'to_dict+provider (ms)':>22} "
+          f"{'rows+provider (ms)':>19}")
+    stdlib = DefaultJSONProvider(app)
+    rng = random.Random(42)
+    for size in sizes:
+        reset_database()
+        now = datetime.utcnow()
+        db.session.add_all([
+            Hydrant(serial_number=f'H{i}', name=f'ברז {i}', location='שער הקיבוץ',
+                    latitude=31.4 + rng.random() * 0.1, longitude=34.6 + rng.random() * 0.1,
+                    last_inspection_date=now - timedelta(days=i % 365), notes='נבדק')
+            for i in range(size)
+        ])
+        db.session.add_all([
+            MaintenanceRecord(item_type='hydrant', item_id=i, item_name=f'ברז {i}', maintenance_type='routine',
+                              description='החלפת אטם', performed_by='צוות א', date=now - timedelta(days=i % 365))
+            for i in range(size)
+        ])
+        db.session.commit()
+        for model in (Hydrant, MaintenanceRecord):
+            def orm_stdlib():
+                db.session.expunge_all()
+                stdlib.dumps([row.to_dict() for row in model.query.order_by(model.id)])
+
+            def orm_provider():
+                db.session.expunge_all()
+                app.json.dumps([row.to_dict() for row in model.query.order_by(model.id)])
+
+            def rows_provider():
+                app.json.dumps(row_dicts(model.query.order_by(model.id), model)[0])
+
+            print(f"{model.__name__:>18} {size:>6} {_timed(orm_stdlib):>18.1f} {_timed(orm_provider):>22.1f} "
+                  f"{_timed(rows_provider):>19.1f}")
+
+
+# Servers compared by the serve benchmark: name -> command (run from the backend directory)
+SERVERS = {
+    'dev (app.py)': [sys.executable, 'app.py'],
+    'gunicorn+gevent': [sys.executable, 'serve.py'],
+}
+SERVE_PATHS = ('/api/hydrants?limit=50', '/api/dashboard/stats')
+
+
+def _start_server(command, port):
+    env = dict(os.environ, FLASK_PORT=str(port), FLASK_DEBUG='False', FLASK_HOST='127.0.0.1')
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/auth/check')
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'Server did not start: {command}')
+
+
+def _stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _login(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', '/api/auth/login', body='{"username": "bench", "password": "bench"}',
+                       headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def _load(port, path, cookie, concurrency, duration):
+    """Keep-alive clients hitting one path; returns (requests/s, p95 ms, errors)"""
+    latencies = []
+    errors = [0]
+    deadline = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+    return len(latencies) / duration, p95, errors[0]
+
+
+def benchmark_serve(concurrency=(1, 10, 50), duration=5, hydrants=500, port=5055):
+    """Throughput of the development server vs the production launcher on the same data"""
+    reset_database()
+    run_migrations()
+    user = User(username='bench', name='Benchmark', role='manager')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.add_all([
+        Hydrant(serial_number=f'H{i}', name=f'Hydrant {i}', location='bench',
+                latitude=31.4 + (i % 50) * 0.001, longitude=34.6 + (i // 50) * 0.001)
+        for i in range(hydrants)
+    ])
+    db.session.commit()
+
+    print(f"{'server':>16} {'path':>24} {'clients':>8} {'req/s':>8} {'p95 (ms)':>9} {'errors':>7}")
+    for name, command in SERVERS.items():
+        process = _start_server(command, port)
+        try:
+            cookie = _login(port)
+            for path in SERVE_PATHS:
+                for clients in concurrency:
+                    rate, p95, errors = _load(port, path, cookie, clients, duration)
+                    print(f"{name:>16} {path:>24} {clients:>8} {rate:>8.0f} {p95:>9.1f} {errors:>7}")
+        finally:
+            _stop_server(process)
+
+
+BENCHMARKS = {
+    'alerts': benchmark_alerts,
+    'distance': benchmark_distance,
+    'serialize': benchmark_serialize,
+    'serve': benchmark_serve,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    try:
+        with app.app_context():
+            for name in names:
+                print(f"\n=== {name} ===")
+                BENCHMARKS[name]()
+    finally:
+        os.remove(_db_path)
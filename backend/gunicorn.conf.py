@@ -0,0 +1,63 @@
+"""
+Gunicorn configuration for production serving of the Fire Department Tracker backend.
+Start it through serve.py, which applies migrations first:
+
+    python serve.py
+
+Settings come from the environment (see .env.example):
+    SERVER_WORKER_CLASS        gevent (default) or eventlet
+    WEB_CONCURRENCY            number of worker processes (default 1)
+    SERVER_WORKER_CONNECTIONS  concurrent connections per worker (default 1000)
+    SERVER_TIMEOUT             seconds before a silent worker is restarted (default 60)
+    SERVER_GRACEFUL_TIMEOUT    seconds in-flight requests get on reload/stop (default 30)
+
+Graceful reload (new code, no dropped requests): kill -HUP <master pid>
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Worker classes that support both HTTP and Socket.IO websockets
+WORKER_CLASSES = {
+    'gevent': 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker',
+    'eventlet': 'eventlet',
+}
+
+worker_mode = os.getenv('SERVER_WORKER_CLASS', 'gevent')
+if worker_mode not in WORKER_CLASSES:
+    raise RuntimeError(f"SERVER_WORKER_CLASS must be one of: {', '.join(WORKER_CLASSES)}")
+
+# The app reads this when it creates the SocketIO server in each worker
+os.environ['SOCKETIO_ASYNC_MODE'] = worker_mode
+
+wsgi_app = 'app:app'
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 5000)}"
+worker_class = WORKER_CLASSES[worker_mode]
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+worker_connections = int(os.getenv('SERVER_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('SERVER_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+pidfile = os.getenv('SERVER_PIDFILE') or None
+accesslog = '-'
+
+
+def on_starting(server):
+    """Refuse worker setups that would silently drop Socket.IO events or sessions"""
+    if workers > 1:
+        if not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+            raise RuntimeError('WEB_CONCURRENCY > 1 requires SOCKETIO_MESSAGE_QUEUE so events reach every worker')
+        # Gunicorn has no sticky sessions between its workers, so long-polling cannot work
+        if os.getenv('SOCKETIO_TRANSPORTS', 'polling,websocket').split(',') != ['websocket']:
+            raise RuntimeError('WEB_CONCURRENCY > 1 requires SOCKETIO_TRANSPORTS=websocket')
+
+
+def post_worker_init(worker):
+    """Per-worker background tasks, started after the async library has patched the worker"""
+    from app import app, counters_reconcile_loop, socketio
+
+    if app.config['DASHBOARD_COUNTERS']:
+        socketio.start_background_task(counters_reconcile_loop)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Fire Department Tracker backend.
+Applies pending migrations once, then replaces itself with the Gunicorn master
+(configured in gunicorn.conf.py) so workers import the app fresh.
+
+Usage:
+    python serve.py
+"""
+
+import os
+import sys
+
+from app import app, run_migrations
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    with app.app_context():
+        run_migrations()
+
+    os.chdir(BACKEND_DIR)
+    args = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py']
+    os.execv(sys.executable, args + sys.argv[1:])
+
+
+if __name__ == '__main__':
+    main()
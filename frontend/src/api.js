@@ -52,6 +52,9 @@ export const changePassword = (currentPassword, newPassword) =>
 
 export const getRoles = () => api.get('/auth/roles');
 
+// Delta sync API (offline replica)
+export const getChanges = (since, params) => api.get('/sync', { params: { since, ...params } });
+
 // Teams API
 export const getTeams = () => api.get('/teams');
 export const getTeam = (id) => api.get(`/teams/${id}`);
@@ -38,7 +38,7 @@ pip install -r requirements.txt > /dev/null 2>&1
 
 # Initialize database
 echo "Initializing database..."
-python3 -c "from app import app, db; app.app_context().push(); db.create_all()"
+python3 -c "from app import app, run_migrations; app.app_context().push(); run_migrations()"
 
 echo "✓ Backend setup complete"
 cd ..